@@ -0,0 +1,68 @@
+"""Admission control shedding work which cannot be finished in time during overload"""
+import contextlib
+import http
+import time
+import threading
+import typing
+
+import exceptions
+import metrics
+
+
+class AdmissionController:
+    """
+    Bounds the number of messages which are executed concurrently and rejects messages which
+    either expired before their execution started or could not get an execution slot in time
+    """
+
+    def __init__(self, max_in_flight: int, max_queue_time: float):
+        """
+        Create a new admission controller
+
+        :param max_in_flight: The maximal number of concurrently executed messages. Zero disables
+            the limit
+        :type max_in_flight: int
+        :param max_queue_time: The maximal number of seconds a message waits for an execution slot
+        :type max_queue_time: float
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue_time = max_queue_time
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    @contextlib.contextmanager
+    def admit(self, deadline: typing.Optional[float] = None) -> typing.Iterator[None]:
+        """
+        Hold an execution slot while the wrapped block is executed
+
+        :param deadline: The unix timestamp after which the caller does not wait for the reply
+            anymore
+        :type deadline: typing.Optional[float]
+        :raises exceptions.ServiceException: The message expired or no slot was available in time
+        """
+        wait_time = self.max_queue_time
+        if deadline is not None:
+            remaining_time = deadline - time.time()
+            if remaining_time <= 0:
+                metrics.SHED_REQUESTS.inc(reason="expired")
+                raise exceptions.ServiceException(
+                    error_code="REQUEST_EXPIRED",
+                    error_name="Request expired",
+                    error_description="The request expired before it could be processed",
+                    status_code=http.HTTPStatus.SERVICE_UNAVAILABLE,
+                )
+            wait_time = min(wait_time, remaining_time)
+        if self._slots is None:
+            yield
+            return
+        if not self._slots.acquire(timeout=wait_time):
+            metrics.SHED_REQUESTS.inc(reason="overloaded")
+            raise exceptions.ServiceException(
+                error_code="SERVICE_OVERLOADED",
+                error_name="Service overloaded",
+                error_description="The service is overloaded and did not process the request",
+                status_code=http.HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+        try:
+            yield
+        finally:
+            self._slots.release()
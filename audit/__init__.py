@@ -0,0 +1,224 @@
+"""
+Asynchronous audit log of the token introspection decisions
+
+The records are collected in a bounded in-memory buffer and written in batches by a background
+thread, either into the ``introspectionAudit`` table or into a rolling local file. Recording never
+blocks the request processing: records which do not fit into the buffer are dropped and counted
+"""
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+import typing
+
+import ujson
+
+import database.crud
+import database.tables
+import exceptions
+import metrics
+import models.responses
+
+_logger = logging.getLogger(__name__)
+
+
+class DatabaseSink:
+    """Writes the audit records into the ``introspectionAudit`` table"""
+
+    def open(self) -> None:
+        database.tables.introspection_audit.create(bind=database.engine, checkfirst=True)
+
+    def write(self, records: list[dict]) -> None:
+        database.crud.store_audit_records(records)
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """Writes the audit records as JSON lines into a file which is rotated by its size"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        """
+        Create a new file sink
+
+        :param path: The path of the audit log file
+        :type path: str
+        :param max_bytes: The size after which the file is rotated
+        :type max_bytes: int
+        :param backup_count: The number of rotated files which are kept
+        :type backup_count: int
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file: typing.Optional[typing.TextIO] = None
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, records: list[dict]) -> None:
+        self._file.write(
+            "".join(
+                ujson.dumps({**record, "timestamp": record["timestamp"].isoformat()}) + "\n"
+                for record in records
+            )
+        )
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class AuditLog(threading.Thread):
+    """
+    A background thread flushing the buffered audit records to a sink once the batch size is
+    reached or the flush interval passed
+    """
+
+    def __init__(
+        self,
+        sink: typing.Union[DatabaseSink, FileSink],
+        buffer_size: int,
+        batch_size: int,
+        flush_interval: float,
+    ):
+        """
+        Create a new audit log
+
+        :param sink: The sink the records are written to
+        :type sink: typing.Union[DatabaseSink, FileSink]
+        :param buffer_size: The maximal number of buffered records
+        :type buffer_size: int
+        :param batch_size: The maximal number of records written at once
+        :type batch_size: int
+        :param flush_interval: The maximal number of seconds a record stays in the buffer
+        :type flush_interval: float
+        """
+        super().__init__(name="audit-log", daemon=True)
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: "queue.Queue[dict]" = queue.Queue(maxsize=buffer_size)
+        self._stop_event = threading.Event()
+        self._sink_opened = False
+
+    def record(
+        self,
+        introspection: models.responses.TokenIntrospection,
+        required_scopes: typing.Optional[list[str]],
+    ) -> None:
+        """
+        Add the outcome of a token introspection to the buffer without blocking
+
+        :param introspection: The result of the token introspection
+        :type introspection: models.responses.TokenIntrospection
+        :param required_scopes: The scopes the token was required to have
+        :type required_scopes: typing.Optional[list[str]]
+        """
+        self._enqueue(
+            token_id=introspection._token_id,
+            account_id=introspection._account_id,
+            required_scopes=required_scopes,
+            active=introspection.active,
+            reason=None if introspection.reason is None else introspection.reason.value,
+        )
+
+    def record_error(self, required_scopes: typing.Optional[list[str]], error: Exception) -> None:
+        """
+        Add a token introspection which ended in an exception to the buffer without blocking
+
+        :param required_scopes: The scopes the token was required to have
+        :type required_scopes: typing.Optional[list[str]]
+        :param error: The exception which ended the token introspection
+        :type error: Exception
+        """
+        self._enqueue(
+            token_id=None,
+            account_id=None,
+            required_scopes=required_scopes,
+            active=False,
+            reason=error.error_code
+            if isinstance(error, exceptions.ServiceException)
+            else "INTERNAL_ERROR",
+        )
+
+    def _enqueue(
+        self,
+        token_id: typing.Optional[int],
+        account_id: typing.Optional[int],
+        required_scopes: typing.Optional[list[str]],
+        active: bool,
+        reason: typing.Optional[str],
+    ) -> None:
+        try:
+            self._buffer.put_nowait(
+                {
+                    "timestamp": datetime.datetime.now(tz=datetime.timezone.utc),
+                    "tokenID": token_id,
+                    "accountID": account_id,
+                    "requiredScopes": None
+                    if required_scopes is None
+                    else " ".join(required_scopes),
+                    "active": active,
+                    "reason": reason,
+                }
+            )
+        except queue.Full:
+            metrics.AUDIT_RECORDS.inc(state="dropped")
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self._flush_batch(deadline=time.monotonic() + self.flush_interval)
+        # Write the remaining records before exiting
+        while not self._buffer.empty():
+            self._flush_batch(deadline=0.0)
+        if self._sink_opened:
+            self.sink.close()
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stop the audit log after writing the buffered records"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def _flush_batch(self, deadline: float) -> None:
+        """Collect records until the batch is full or the deadline passed and write them"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        if len(batch) == 0:
+            return
+        try:
+            # The sink is (re-)opened with the next batch until it becomes available
+            if not self._sink_opened:
+                self.sink.open()
+                self._sink_opened = True
+            self.sink.write(batch)
+        except Exception as e:
+            metrics.AUDIT_RECORDS.inc(len(batch), state="failed")
+            _logger.error("Unable to write %s audit records", len(batch), exc_info=e)
+            return
+        metrics.AUDIT_RECORDS.inc(len(batch), state="written")
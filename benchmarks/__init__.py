@@ -0,0 +1 @@
+"""Benchmarks measuring the performance of the service against a seeded local database"""
@@ -0,0 +1,191 @@
+"""A seeded SQLite stand-in for the PostgreSQL database used by the benchmarks"""
+import dataclasses
+import datetime
+import hashlib
+import os
+import secrets
+import typing
+
+import sqlalchemy
+import sqlalchemy.event
+import sqlalchemy.pool
+
+import database
+import database.tables
+import tasks.snapshots
+
+
+@dataclasses.dataclass
+class SeededData:
+    """The plain values of the objects stored in the seeded database"""
+
+    scope_values: list[str]
+    """The string values of all seeded scopes"""
+
+    access_tokens: list[str]
+    """The plain values of the valid access tokens"""
+
+    token_scopes: dict[str, list[str]]
+    """The scope values associated to every valid access token"""
+
+    expired_access_tokens: list[str]
+    """The plain values of the expired access tokens"""
+
+    refresh_tokens: list[str]
+    """The plain values of the refresh tokens"""
+
+    account_ids: list[int]
+    """The ids of the seeded accounts"""
+
+    usernames: list[str]
+    """The usernames of the seeded accounts"""
+
+
+def create_engine(directory: typing.Optional[str] = None) -> sqlalchemy.engine.Engine:
+    """
+    Create an engine for a SQLite database which provides the ``authorization`` schema used by
+    the tables and install it as the engine of the service
+
+    :param directory: The directory in which the database files are created. Without a directory
+        a single shared in-memory connection is used, which is not suited for concurrent access
+    :type directory: typing.Optional[str]
+    :return: The engine connected to the database
+    :rtype: sqlalchemy.engine.Engine
+    """
+    if directory is None:
+        engine = sqlalchemy.create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=sqlalchemy.pool.StaticPool,
+        )
+        schema_file = ":memory:"
+    else:
+        engine = sqlalchemy.create_engine(
+            f"sqlite:///{os.path.join(directory, 'main.db')}",
+            connect_args={"check_same_thread": False},
+            poolclass=sqlalchemy.pool.QueuePool,
+            pool_size=32,
+        )
+        schema_file = os.path.join(directory, "authorization.db")
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _attach_schema(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE '{schema_file}' AS \"authorization\"")
+
+    database.engine = engine
+    database.replica_engine = None
+    database.tables.initialize()
+    return engine
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha3_224(token.encode("utf-8")).hexdigest()
+
+
+def seed(
+    account_count: int = 100,
+    scope_count: int = 64,
+    token_count: int = 1000,
+    scope_counts: tuple[int, ...] = (1, 4, 16),
+) -> SeededData:
+    """
+    Fill the tables of the installed engine with accounts, scopes and tokens
+
+    :param account_count: The number of accounts that are created
+    :type account_count: int
+    :param scope_count: The number of scopes that are created
+    :type scope_count: int
+    :param token_count: The number of valid access tokens that are created
+    :type token_count: int
+    :param scope_counts: The numbers of scopes the access tokens are associated to (round-robin)
+    :type scope_counts: tuple[int, ...]
+    :return: The plain values of the seeded objects
+    :rtype: SeededData
+    """
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    scope_values = [f"scope:{index}" for index in range(scope_count)]
+    usernames = [f"user-{index}" for index in range(account_count)]
+    access_tokens = [secrets.token_urlsafe(32) for _ in range(token_count)]
+    expired_access_tokens = [secrets.token_urlsafe(32) for _ in range(token_count // 10)]
+    refresh_tokens = [secrets.token_urlsafe(32) for _ in range(token_count // 10)]
+    token_scopes: dict[str, list[str]] = {}
+    with database.engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.insert(database.tables.scopes),
+            [
+                {"id": index + 1, "name": value, "description": value, "value": value}
+                for index, value in enumerate(scope_values)
+            ],
+        )
+        connection.execute(
+            sqlalchemy.insert(database.tables.accounts),
+            [
+                {
+                    "id": index + 1,
+                    "firstName": "Bench",
+                    "lastName": username,
+                    "username": username,
+                    "password": "not-a-real-password-hash",
+                    "active": True,
+                }
+                for index, username in enumerate(usernames)
+            ],
+        )
+        token_rows = []
+        token_scope_rows = []
+        for index, token in enumerate(access_tokens + expired_access_tokens):
+            expired = index >= token_count
+            token_rows.append(
+                {
+                    "id": index + 1,
+                    "value": _hash(token),
+                    "active": True,
+                    "expires": now + datetime.timedelta(hours=-1 if expired else 1),
+                    "created": now - datetime.timedelta(hours=2 if expired else 0, minutes=1),
+                    "accountID": index % account_count + 1,
+                }
+            )
+            associated_scopes = scope_counts[index % len(scope_counts)]
+            token_scopes[token] = scope_values[:associated_scopes]
+            token_scope_rows.extend(
+                {"tokenID": index + 1, "scopeID": scope_id + 1}
+                for scope_id in range(associated_scopes)
+            )
+        connection.execute(sqlalchemy.insert(database.tables.access_token), token_rows)
+        connection.execute(sqlalchemy.insert(database.tables.access_token_scopes), token_scope_rows)
+        # Grant the scopes of the access tokens to every account via a single role
+        connection.execute(
+            sqlalchemy.insert(database.tables.roles),
+            [{"id": 1, "name": "bench", "description": ""}],
+        )
+        connection.execute(
+            sqlalchemy.insert(database.tables.role_scopes),
+            [{"roleID": 1, "scopeID": scope_id + 1} for scope_id in range(max(scope_counts))],
+        )
+        connection.execute(
+            sqlalchemy.insert(database.tables.account_roles),
+            [{"accountID": account_id + 1, "scopeID": 1} for account_id in range(account_count)],
+        )
+        connection.execute(
+            sqlalchemy.insert(database.tables.refresh_token),
+            [
+                {
+                    "id": index + 1,
+                    "value": _hash(token),
+                    "active": True,
+                    "expires": now + datetime.timedelta(days=1),
+                    "accountID": index % account_count + 1,
+                }
+                for index, token in enumerate(refresh_tokens)
+            ],
+        )
+    tasks.snapshots.backfill()
+    return SeededData(
+        scope_values=scope_values,
+        access_tokens=access_tokens,
+        token_scopes={token: token_scopes[token] for token in access_tokens},
+        expired_access_tokens=expired_access_tokens,
+        refresh_tokens=refresh_tokens,
+        account_ids=list(range(1, account_count + 1)),
+        usernames=usernames,
+    )
@@ -0,0 +1,325 @@
+"""
+End-to-end load harness driving the message handling of the service through an in-memory broker
+
+The broker stand-in delivers every message to the same ``content_validator``/``executor`` pair
+which is handed to ``amqp_rpc_server.Server`` and returns the reply to the waiting caller. Run it
+with ``python -m benchmarks.load --concurrency 32 --duration 30 --distribution zipf``
+"""
+import argparse
+import bisect
+import dataclasses
+import itertools
+import json
+import logging
+import queue
+import random
+import secrets
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+import msgpack
+import ujson
+
+import database.cache
+import enums
+import server_functions
+import wire
+from benchmarks import fixtures
+
+
+@dataclasses.dataclass
+class _Message:
+    """A message waiting in the queue of the broker stand-in"""
+
+    body: bytes
+    reply_to: "queue.SimpleQueue[typing.Optional[bytes]]"
+    published_at: float
+
+
+class InMemoryBroker:
+    """
+    A replacement for the message broker and ``amqp_rpc_server.Server`` which delivers the
+    published messages to a pool of consumer threads running the validator and the executor
+    """
+
+    def __init__(
+        self,
+        content_validator: typing.Callable[[bytes], bool],
+        executor: typing.Callable[[bytes], bytes],
+        consumers: int,
+    ):
+        """
+        Create a new broker stand-in
+
+        :param content_validator: The function rejecting malformed messages
+        :type content_validator: typing.Callable[[bytes], bool]
+        :param executor: The function generating the reply for a message
+        :type executor: typing.Callable[[bytes], bytes]
+        :param consumers: The number of threads consuming the queue
+        :type consumers: int
+        """
+        self.content_validator = content_validator
+        self.executor = executor
+        self._queue: "queue.SimpleQueue[typing.Optional[_Message]]" = queue.SimpleQueue()
+        self._consumers = [
+            threading.Thread(target=self._consume, name=f"consumer-{index}", daemon=True)
+            for index in range(consumers)
+        ]
+        self.queue_times: list[float] = []
+
+    def start(self) -> None:
+        """Start consuming the queue"""
+        for consumer in self._consumers:
+            consumer.start()
+
+    def stop(self) -> None:
+        """Stop the consumers after the queued messages have been handled"""
+        for _ in self._consumers:
+            self._queue.put(None)
+        for consumer in self._consumers:
+            consumer.join()
+
+    def call(self, body: bytes, timeout: typing.Optional[float] = None) -> typing.Optional[bytes]:
+        """
+        Publish a message and wait for the reply
+
+        :param body: The body of the message
+        :type body: bytes
+        :param timeout: The number of seconds waited for the reply
+        :type timeout: typing.Optional[float]
+        :return: The reply or ``None`` if the message was rejected
+        :rtype: typing.Optional[bytes]
+        """
+        reply_to: "queue.SimpleQueue[typing.Optional[bytes]]" = queue.SimpleQueue()
+        self._queue.put(_Message(body, reply_to, time.perf_counter()))
+        return reply_to.get(timeout=timeout)
+
+    def _consume(self) -> None:
+        while (message := self._queue.get()) is not None:
+            self.queue_times.append(time.perf_counter() - message.published_at)
+            if not self.content_validator(message.body):
+                message.reply_to.put(None)
+                continue
+            message.reply_to.put(self.executor(message.body))
+
+
+class TokenPicker:
+    """Picks the tokens used in the requests following a configurable distribution"""
+
+    def __init__(
+        self,
+        tokens: list[str],
+        distribution: str,
+        zipf_exponent: float,
+        invalid_ratio: float,
+        seed: int,
+    ):
+        """
+        Create a new token picker
+
+        :param tokens: The valid tokens
+        :type tokens: list[str]
+        :param distribution: Either ``uniform`` or ``zipf``
+        :type distribution: str
+        :param zipf_exponent: The exponent of the zipf distribution
+        :type zipf_exponent: float
+        :param invalid_ratio: The share of requests using a token unknown to the service
+        :type invalid_ratio: float
+        :param seed: The seed of the random number generator
+        :type seed: int
+        """
+        self.tokens = tokens
+        self.invalid_ratio = invalid_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cumulative_weights: typing.Optional[list[float]] = None
+        if distribution == "zipf":
+            self._cumulative_weights = list(
+                itertools.accumulate(
+                    1 / rank**zipf_exponent for rank in range(1, len(tokens) + 1)
+                )
+            )
+
+    def pick(self) -> tuple[str, bool]:
+        """
+        Pick the token for the next request
+
+        :return: The token and ``True`` if the token is a valid token
+        :rtype: tuple[str, bool]
+        """
+        with self._lock:
+            if self._random.random() < self.invalid_ratio:
+                return secrets.token_urlsafe(32), False
+            if self._cumulative_weights is None:
+                return self._random.choice(self.tokens), True
+            point = self._random.random() * self._cumulative_weights[-1]
+            return self.tokens[bisect.bisect_left(self._cumulative_weights, point)], True
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile))]
+
+
+def run(
+    concurrency: int,
+    consumers: int,
+    duration: float,
+    distribution: str,
+    zipf_exponent: float,
+    invalid_ratio: float,
+    token_count: int,
+    seed: int,
+    timeout: typing.Optional[float] = None,
+    encoding: str = "json",
+) -> dict:
+    """
+    Seed the database stand-in and drive the service with concurrent callers
+
+    :return: The throughput, latencies and outcomes of the run
+    :rtype: dict
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        fixtures.create_engine(directory)
+        data = fixtures.seed(token_count=token_count)
+        picker = TokenPicker(data.access_tokens, distribution, zipf_exponent, invalid_ratio, seed)
+        broker = InMemoryBroker(
+            server_functions.content_validator, server_functions.executor, consumers
+        )
+        broker.start()
+        latencies: list[list[float]] = [[] for _ in range(concurrency)]
+        outcomes: list[dict[str, int]] = [{} for _ in range(concurrency)]
+        # The replies which answered the introspection before the caller gave up
+        answered = [0] * concurrency
+        deadline = time.perf_counter() + duration
+
+        def _caller(index: int) -> None:
+            while time.perf_counter() < deadline:
+                token, _ = picker.pick()
+                content = {
+                    "action": enums.Action.CHECK_TOKEN_SCOPE.value,
+                    "token": token,
+                    "scopes": data.token_scopes.get(token),
+                }
+                if timeout is not None:
+                    content["deadline"] = time.time() + timeout
+                if encoding == "msgpack":
+                    body = wire.encode(content)
+                else:
+                    body = ujson.dumps(content).encode("utf-8")
+                start = time.perf_counter()
+                try:
+                    reply = broker.call(body, timeout)
+                except queue.Empty:
+                    reply = b"timeout"
+                latencies[index].append(time.perf_counter() - start)
+                if reply == b"timeout":
+                    outcome = "timeout"
+                elif reply is None:
+                    outcome = "rejected"
+                else:
+                    if encoding == "msgpack":
+                        content = msgpack.unpackb(reply)
+                        if type(content) is list:
+                            content = {"active": content[0], "reason": content[1]}
+                    else:
+                        content = ujson.loads(reply)
+                    if "error" in content:
+                        outcome = content["error"].rsplit(".", 1)[-1]
+                    elif content["active"]:
+                        outcome = "active"
+                    else:
+                        outcome = content["reason"]
+                    if "error" not in content:
+                        answered[index] += 1
+                outcomes[index][outcome] = outcomes[index].get(outcome, 0) + 1
+
+        callers = [threading.Thread(target=_caller, args=(index,)) for index in range(concurrency)]
+        start = time.perf_counter()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        elapsed = time.perf_counter() - start
+        broker.stop()
+        database.engine.dispose()
+    all_latencies = sorted(itertools.chain.from_iterable(latencies))
+    queue_times = sorted(broker.queue_times)
+    total_outcomes: dict[str, int] = {}
+    for caller_outcomes in outcomes:
+        for outcome, count in caller_outcomes.items():
+            total_outcomes[outcome] = total_outcomes.get(outcome, 0) + count
+    return {
+        "configuration": {
+            "concurrency": concurrency,
+            "consumers": consumers,
+            "duration": duration,
+            "distribution": distribution,
+            "zipf_exponent": zipf_exponent,
+            "invalid_ratio": invalid_ratio,
+            "token_count": token_count,
+            "timeout": timeout,
+            "encoding": encoding,
+            "cache_enabled": database.cache.is_enabled(),
+        },
+        "requests": len(all_latencies),
+        "throughput_per_second": len(all_latencies) / elapsed,
+        "goodput_per_second": sum(answered) / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(all_latencies) * 1000 if all_latencies else 0.0,
+            "p50": _percentile(all_latencies, 0.50) * 1000,
+            "p90": _percentile(all_latencies, 0.90) * 1000,
+            "p99": _percentile(all_latencies, 0.99) * 1000,
+            "max": all_latencies[-1] * 1000 if all_latencies else 0.0,
+        },
+        "queue_time_ms": {
+            "p50": _percentile(queue_times, 0.50) * 1000,
+            "p99": _percentile(queue_times, 0.99) * 1000,
+        },
+        "outcomes": total_outcomes,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16, help="number of parallel callers")
+    parser.add_argument("--consumers", type=int, default=4, help="number of consumer threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run the load")
+    parser.add_argument("--distribution", choices=("uniform", "zipf"), default="zipf")
+    parser.add_argument("--zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--invalid-ratio", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=10000, help="number of seeded tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="seconds a caller waits for a reply; also sent as the deadline of the message",
+    )
+    parser.add_argument("--encoding", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--output", default=None, help="file into which the results are written")
+    arguments = parser.parse_args()
+    results = run(
+        concurrency=arguments.concurrency,
+        consumers=arguments.consumers,
+        duration=arguments.duration,
+        distribution=arguments.distribution,
+        zipf_exponent=arguments.zipf_exponent,
+        invalid_ratio=arguments.invalid_ratio,
+        token_count=arguments.tokens,
+        seed=arguments.seed,
+        timeout=arguments.timeout,
+        encoding=arguments.encoding,
+    )
+    if arguments.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
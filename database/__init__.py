@@ -1,5 +1,8 @@
 """"""
 import logging
+import threading
+import time
+import typing
 
 import sqlalchemy
 import sqlalchemy.engine
@@ -9,11 +12,96 @@ import settings
 
 __logger = logging.getLogger(__name__)
 
-_settings = settings.DatabaseConfiguration()
-"""The settings for the database connection"""
+_engine_lock = threading.Lock()
+"""Lock guarding the construction of the database engine"""
 
-engine = sqlalchemy.engine.create_engine(
-    url=_settings.dsn,
-    pool_recycle=90  # Reconnect to the database every 90 seconds, to keep the connection from
-    # aborting
-)
+
+def get_engine() -> sqlalchemy.engine.Engine:
+    """
+    Get the engine used for the database connection.
+
+    The engine is constructed on the first access, which keeps the settings from being read and
+    the connection pool from being created as an import side effect
+
+    :return: The engine connected to the configured database
+    :rtype: sqlalchemy.engine.Engine
+    """
+    global engine
+    with _engine_lock:
+        if "engine" not in globals():
+            _settings = settings.DatabaseConfiguration()
+            engine = sqlalchemy.engine.create_engine(
+                url=_settings.dsn,
+                pool_recycle=90,  # Reconnect to the database every 90 seconds, to keep the
+                # connection from aborting
+                connect_args={"connect_timeout": _settings.connect_timeout},
+            )
+    return globals()["engine"]
+
+
+def get_replica_engine() -> typing.Optional[sqlalchemy.engine.Engine]:
+    """
+    Get the engine used for the connection to the read replica.
+
+    The engine is constructed on the first access like the engine of the primary database
+
+    :return: The engine connected to the read replica or ``None`` if no replica is configured
+    :rtype: typing.Optional[sqlalchemy.engine.Engine]
+    """
+    global replica_engine
+    with _engine_lock:
+        if "replica_engine" not in globals():
+            _settings = settings.DatabaseConfiguration()
+            replica_engine = None
+            if _settings.replica_dsn is not None:
+                replica_engine = sqlalchemy.engine.create_engine(
+                    url=_settings.replica_dsn,
+                    pool_recycle=90,
+                    pool_pre_ping=True,
+                    connect_args={"connect_timeout": _settings.connect_timeout},
+                )
+    return globals()["replica_engine"]
+
+
+_replica_unhealthy_until = 0.0
+"""The monotonic time until which the read replica is not used"""
+
+
+def get_read_engine() -> typing.Optional[sqlalchemy.engine.Engine]:
+    """
+    Get the engine on which read-only queries are executed
+
+    :return: The engine of the read replica or ``None`` if no replica is configured or the replica
+        is currently considered unhealthy
+    :rtype: typing.Optional[sqlalchemy.engine.Engine]
+    """
+    read_engine = replica_engine if "replica_engine" in globals() else get_replica_engine()
+    if read_engine is None or time.monotonic() < _replica_unhealthy_until:
+        return None
+    return read_engine
+
+
+def mark_replica_unhealthy(error: typing.Optional[Exception] = None) -> None:
+    """
+    Route the read-only queries to the primary database until the retry interval passed
+
+    :param error: The error which made the replica unhealthy
+    :type error: typing.Optional[Exception]
+    """
+    global _replica_unhealthy_until
+    retry_interval = settings.DatabaseConfiguration().replica_retry_interval
+    _replica_unhealthy_until = time.monotonic() + retry_interval
+    __logger.warning(
+        "The read replica is unavailable. Using the primary database for the next %ss",
+        retry_interval,
+        exc_info=error,
+    )
+
+
+def __getattr__(name: str):
+    """Construct the engines lazily when they are accessed the first time"""
+    if name == "engine":
+        return get_engine()
+    if name == "replica_engine":
+        return get_replica_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
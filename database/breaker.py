@@ -0,0 +1,137 @@
+"""Circuit breaker failing the database operations fast while the database is unreachable"""
+import enum
+import logging
+import threading
+import time
+import typing
+
+import sqlalchemy
+
+import database
+import metrics
+import settings
+
+_logger = logging.getLogger(__name__)
+
+
+class State(str, enum.Enum):
+    """The states of the circuit breaker"""
+
+    CLOSED = "closed"
+    """The database is reachable and the operations are executed"""
+
+    OPEN = "open"
+    """The database is unreachable and the operations fail without being executed"""
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker which opens after a number of consecutive connection failures.
+
+    While the circuit is open a background thread probes the database and closes the circuit as
+    soon as a probe succeeds
+    """
+
+    def __init__(
+        self, failure_threshold: int, probe_interval: float, probe: typing.Callable[[], None]
+    ):
+        """
+        Create a new circuit breaker
+
+        :param failure_threshold: The number of consecutive failures opening the circuit. Zero
+            disables the circuit breaker
+        :type failure_threshold: int
+        :param probe_interval: The number of seconds between two recovery probes
+        :type probe_interval: float
+        :param probe: A function raising an exception if the database is still unreachable
+        :type probe: typing.Callable[[], None]
+        """
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.state = State.CLOSED
+        self._consecutive_failures = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check if an operation may be executed"""
+        return self.state is State.CLOSED
+
+    def record_success(self) -> None:
+        """Record an operation which reached the database"""
+        self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Record an operation which failed to reach the database"""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._consecutive_failures += 1
+            if self.state is State.OPEN or self._consecutive_failures < self.failure_threshold:
+                return
+            self.state = State.OPEN
+        metrics.BREAKER_TRANSITIONS.inc(state=State.OPEN.value)
+        _logger.error(
+            "Opened the circuit breaker after %s consecutive database failures",
+            self._consecutive_failures,
+        )
+        threading.Thread(
+            target=self._probe_until_recovered, name="breaker-probe", daemon=True
+        ).start()
+
+    def _probe_until_recovered(self) -> None:
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self.probe()
+            except Exception as e:
+                _logger.debug("The database is still unavailable", exc_info=e)
+                continue
+            with self._lock:
+                self.state = State.CLOSED
+                self._consecutive_failures = 0
+            metrics.BREAKER_TRANSITIONS.inc(state=State.CLOSED.value)
+            _logger.info("The database is reachable again. Closed the circuit breaker")
+            return
+
+
+def _probe_primary() -> None:
+    """Execute a trivial query on the primary database"""
+    with database.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("SELECT 1"))
+
+
+circuit_breaker: CircuitBreaker
+"""The circuit breaker guarding the primary database"""
+
+stale_grace_period: float
+"""The number of seconds after their expiry cached results are served while the circuit is open"""
+
+_breaker_lock = threading.Lock()
+"""Lock guarding the construction of the circuit breaker"""
+
+
+def _create_circuit_breaker() -> None:
+    """
+    Construct the circuit breaker on the first access, which keeps the settings from being read
+    as an import side effect
+    """
+    global circuit_breaker, stale_grace_period
+    with _breaker_lock:
+        if "circuit_breaker" in globals():
+            return
+        _settings = settings.CircuitBreakerConfiguration()
+        stale_grace_period = _settings.stale_grace_period
+        circuit_breaker = CircuitBreaker(
+            failure_threshold=_settings.failure_threshold,
+            probe_interval=_settings.probe_interval,
+            probe=_probe_primary,
+        )
+
+
+def __getattr__(name: str):
+    """Construct the circuit breaker lazily when it is accessed the first time"""
+    if name in ("circuit_breaker", "stale_grace_period"):
+        _create_circuit_breaker()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,187 @@
+"""In-process caches for the results of the database queries used by the token introspection"""
+import collections
+import threading
+import time
+import typing
+
+import settings
+
+_KeyType = typing.TypeVar("_KeyType", bound=typing.Hashable)
+_ValueType = typing.TypeVar("_ValueType")
+
+
+class TTLCache(typing.Generic[_KeyType, _ValueType]):
+    """
+    A thread-safe least-recently-used cache whose entries expire after a fixed time to live.
+
+    A cache with a maximal size of zero does not store anything, which allows disabling the cache
+    without changing the code using it
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Create a new cache
+
+        :param max_size: The maximal number of entries held by the cache
+        :type max_size: int
+        :param ttl: The number of seconds after which an entry expires
+        :type ttl: float
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[
+            _KeyType, tuple[float, _ValueType]
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: _KeyType) -> typing.Optional[_ValueType]:
+        """
+        Get the value stored for the key
+
+        :param key: The key of the entry
+        :return: The value if an entry exists which is not expired, else ``None``
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_stale(self, key: _KeyType, grace_period: float) -> typing.Optional[_ValueType]:
+        """
+        Get the value stored for the key even if the entry expired less than the grace period ago
+
+        :param key: The key of the entry
+        :param grace_period: The number of seconds an expired entry is still returned
+        :type grace_period: float
+        :return: The value if an entry exists which is usable, else ``None``
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl + grace_period:
+                return None
+            return value
+
+    def set(self, key: _KeyType, value: _ValueType) -> None:
+        """
+        Store the value for the key and evict the least recently used entry if the cache is full
+
+        :param key: The key of the entry
+        :param value: The value which shall be stored
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: _KeyType) -> None:
+        """
+        Remove the entry stored for the key
+
+        :param key: The key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+scopes: TTLCache[tuple[str, typing.Union[str, int]], typing.Any]
+"""The scopes keyed by ``("id", <id>)`` and ``("value", <scope string value>)``"""
+
+accounts: TTLCache[int, typing.Any]
+"""The user accounts keyed by their id"""
+
+access_tokens: TTLCache[str, typing.Any]
+"""The access tokens keyed by the hash of the token value"""
+
+access_token_scopes: TTLCache[int, tuple[int, ...]]
+"""The ids of the scopes associated to an access token keyed by the id of the token"""
+
+account_snapshots: TTLCache[int, typing.Any]
+"""The authorization snapshots of the accounts keyed by the account id"""
+
+revocations: TTLCache[int, bool]
+"""The revocation status of signed access tokens keyed by the id of the token"""
+
+_CACHE_NAMES = (
+    "scopes",
+    "accounts",
+    "access_tokens",
+    "access_token_scopes",
+    "account_snapshots",
+    "revocations",
+)
+"""The names of the caches constructed from the settings"""
+
+_caches_lock = threading.Lock()
+"""Lock guarding the construction of the caches"""
+
+
+def _create_caches() -> None:
+    """
+    Construct the caches on the first access, which keeps the settings from being read as an
+    import side effect
+    """
+    global scopes, accounts, access_tokens, access_token_scopes, account_snapshots, revocations
+    global _enabled
+    with _caches_lock:
+        if "_enabled" in globals():
+            return
+        _settings = settings.CacheConfiguration()
+        _snapshot_settings = settings.AccountSnapshotConfiguration()
+        _signed_token_settings = settings.SignedTokenConfiguration()
+        _token_index_settings = settings.TokenIndexConfiguration()
+        scopes = TTLCache(
+            max_size=_settings.max_scopes if _settings.enabled else 0, ttl=_settings.scope_ttl
+        )
+        accounts = TTLCache(
+            max_size=_settings.max_accounts if _settings.enabled else 0, ttl=_settings.ttl
+        )
+        access_tokens = TTLCache(
+            max_size=_settings.max_tokens if _settings.enabled else 0, ttl=_settings.ttl
+        )
+        access_token_scopes = TTLCache(
+            max_size=_settings.max_tokens if _settings.enabled else 0, ttl=_settings.ttl
+        )
+        account_snapshots = TTLCache(
+            max_size=_settings.max_accounts if _settings.enabled else 0,
+            ttl=_snapshot_settings.cache_ttl,
+        )
+        revocations = TTLCache(
+            max_size=_signed_token_settings.max_revocation_entries
+            if _signed_token_settings.enabled or _token_index_settings.enabled
+            else 0,
+            ttl=_signed_token_settings.revocation_ttl,
+        )
+        _enabled = _settings.enabled
+
+
+def is_enabled() -> bool:
+    """Check if the query results are cached"""
+    _create_caches()
+    return globals()["_enabled"]
+
+
+def __getattr__(name: str):
+    """Construct the caches lazily when they are accessed the first time"""
+    if name in _CACHE_NAMES:
+        _create_caches()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,140 @@
+import contextlib
+import datetime
 import hashlib
 import typing
 
+import sqlalchemy.engine
+import sqlalchemy.exc
 import sqlalchemy.sql
 
 import database
+import database.breaker
+import database.cache
 import database.tables
+import exceptions
+import metrics
 import models.common
 import models.requests
 import models.responses
+import tokenindex
+
+token_index: typing.Optional[tokenindex.TokenIndex] = None
+"""The memory-mapped token index consulted before the database (set by the service if enabled)"""
+
+
+def _read(query, use_primary: bool = False) -> sqlalchemy.engine.CursorResult:
+    """
+    Execute a read-only query on the read replica if one is configured and healthy.
+
+    A query failing due to an unreachable replica is retried on the primary database and the
+    replica is not used again until the retry interval passed
+
+    :param query: The query which shall be executed
+    :param use_primary: Execute the query on the primary database, e.g. for reading own writes
+    :type use_primary: bool
+    :return: The result of the query
+    :rtype: sqlalchemy.engine.CursorResult
+    :raises exceptions.DatabaseUnavailable: The primary database is unavailable
+    """
+    read_engine = None if use_primary else database.get_read_engine()
+    if read_engine is not None:
+        try:
+            return read_engine.execute(query)
+        except sqlalchemy.exc.DBAPIError as e:
+            # Errors caused by the query itself are not retried on the primary database
+            if not (
+                isinstance(e, (sqlalchemy.exc.OperationalError, sqlalchemy.exc.InterfaceError))
+                or e.connection_invalidated
+            ):
+                raise
+            database.mark_replica_unhealthy(e)
+    return _execute_on_primary(query)
+
+
+def _read_first(query, use_primary: bool = False) -> typing.Optional[sqlalchemy.engine.Row]:
+    """
+    Get the first row of a read-only query.
+
+    A row missing on the read replica may not have been replicated yet, so the query is repeated
+    on the primary database before the row is reported as missing
+
+    :param query: The query which shall be executed
+    :param use_primary: Execute the query on the primary database, e.g. for reading own writes
+    :type use_primary: bool
+    :return: The first row or ``None`` if the query returned no rows
+    :rtype: typing.Optional[sqlalchemy.engine.Row]
+    :raises exceptions.DatabaseUnavailable: The primary database is unavailable
+    """
+    row = _read(query, use_primary).first()
+    if row is None and not use_primary and database.get_read_engine() is not None:
+        row = _read(query, use_primary=True).first()
+    return row
+
+
+@contextlib.contextmanager
+def _guarded_by_circuit_breaker() -> typing.Iterator[None]:
+    """
+    Run the block unless the circuit breaker is open and record whether it reached the database
+
+    :raises exceptions.DatabaseUnavailable: The primary database is unavailable
+    """
+    circuit_breaker = database.breaker.circuit_breaker
+    if not circuit_breaker.allow():
+        raise exceptions.DatabaseUnavailable()
+    try:
+        yield
+    except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.InterfaceError) as e:
+        circuit_breaker.record_failure()
+        raise exceptions.DatabaseUnavailable() from e
+    circuit_breaker.record_success()
+
+
+def _execute_on_primary(query) -> sqlalchemy.engine.CursorResult:
+    """
+    Execute a query on the primary database unless the circuit breaker is open
+
+    :param query: The query which shall be executed
+    :return: The result of the query
+    :rtype: sqlalchemy.engine.CursorResult
+    :raises exceptions.DatabaseUnavailable: The primary database is unavailable
+    """
+    with _guarded_by_circuit_breaker():
+        return database.engine.execute(query)
+
+
+@contextlib.contextmanager
+def _transaction_on_primary() -> typing.Iterator[sqlalchemy.engine.Connection]:
+    """
+    Open a transaction on the primary database unless the circuit breaker is open
+
+    :return: The connection on which the transaction is running
+    :rtype: typing.Iterator[sqlalchemy.engine.Connection]
+    :raises exceptions.DatabaseUnavailable: The primary database is unavailable
+    """
+    with _guarded_by_circuit_breaker(), database.engine.begin() as connection:
+        yield connection
+
+
+def _stale(
+    cache: database.cache.TTLCache,
+    cache_name: str,
+    key: typing.Hashable,
+    error: exceptions.DatabaseUnavailable,
+):
+    """
+    Get an expired cache entry which is still within the grace period during a database outage
+
+    :raises exceptions.DatabaseUnavailable: No usable cache entry exists
+    """
+    value = cache.get_stale(key, database.breaker.stale_grace_period)
+    if value is None:
+        raise error
+    metrics.STALE_READS.inc(cache=cache_name)
+    return value
 
 
 # %% Operations for getting users
+@metrics.QUERY_DURATION.timed(query="get_user_account")
 def get_user_account(identifier: typing.Union[str, int]):
     """
     Get the user account specified in the database
@@ -20,6 +144,10 @@ def get_user_account(identifier: typing.Union[str, int]):
     :return:
     :rtype:
     """
+    if type(identifier) is int:
+        cached_user = database.cache.accounts.get(identifier)
+        if cached_user is not None:
+            return cached_user
     if type(identifier) is str:
         user_query = sqlalchemy.sql.select(
             [database.tables.accounts],
@@ -32,21 +160,66 @@ def get_user_account(identifier: typing.Union[str, int]):
         )
     else:
         raise TypeError("Expected identifier to by either string or int")
-    user_query_result = database.engine.execute(user_query).first()
+    try:
+        user_query_result = _read_first(user_query)
+    except exceptions.DatabaseUnavailable as error:
+        if type(identifier) is not int:
+            raise
+        return _stale(database.cache.accounts, "accounts", identifier, error)
     if user_query_result is None:
         return user_query_result
+    user = _user_account_from_row(user_query_result)
+    database.cache.accounts.set(user.id, user)
+    return user
+
+
+@metrics.QUERY_DURATION.timed(query="get_user_accounts")
+def get_user_accounts(identifiers: typing.Iterable[int]) -> list[models.common.UserAccount]:
+    """
+    Get the user accounts with the specified ids in a single query
+
+    :param identifiers: The ids of the user accounts
+    :type identifiers: typing.Iterable[int]
+    :return: The user accounts which were found
+    :rtype: list[models.common.UserAccount]
+    """
+    user_query = sqlalchemy.sql.select(
+        [database.tables.accounts],
+        database.tables.accounts.c.id.in_(list(identifiers)),
+    )
+    user_query_result = _read(user_query).all()
+    return [_user_account_from_row(row) for row in user_query_result]
+
+
+def _user_account_from_row(row) -> models.common.UserAccount:
     return models.common.UserAccount(
-        id=user_query_result[0],
-        first_name=user_query_result[1],
-        last_name=user_query_result[2],
-        username=user_query_result[3],
-        password=user_query_result[4],
-        active=user_query_result[5],
+        id=row[0],
+        first_name=row[1],
+        last_name=row[2],
+        username=row[3],
+        password=row[4],
+        active=row[5],
     )
 
 
 # %% Operations for the scopes
-def get_scope(identifier: typing.Union[str, int]):
+@metrics.QUERY_DURATION.timed(query="get_scope")
+def get_scope(identifier: typing.Union[str, int], use_primary: bool = False):
+    """
+    Get the scope specified in the database
+
+    :param identifier: The id or the string value of the scope
+    :type identifier: typing.Union[str, int]
+    :param use_primary: Read from the primary database, e.g. to read a scope which was just written
+    :type use_primary: bool
+    :return: The scope or ``None`` if the scope does not exist
+    :rtype: typing.Optional[models.common.Scope]
+    """
+    if not use_primary:
+        cache_key = ("value" if type(identifier) is str else "id", identifier)
+        cached_scope = database.cache.scopes.get(cache_key)
+        if cached_scope is not None:
+            return cached_scope
     if type(identifier) is str:
         scope_query = sqlalchemy.sql.select(
             [database.tables.scopes],
@@ -59,79 +232,181 @@ def get_scope(identifier: typing.Union[str, int]):
         )
     else:
         raise TypeError("Expected identifier to by either string or int")
-    scope_query_result = database.engine.execute(scope_query).first()
+    try:
+        scope_query_result = _read_first(scope_query, use_primary)
+    except exceptions.DatabaseUnavailable as error:
+        cache_key = ("value" if type(identifier) is str else "id", identifier)
+        return _stale(database.cache.scopes, "scopes", cache_key, error)
     if scope_query_result is None:
         return None
+    scope = _scope_from_row(scope_query_result)
+    _cache_scope(scope)
+    return scope
+
+
+@metrics.QUERY_DURATION.timed(query="get_all_scopes")
+def get_all_scopes() -> list[models.common.Scope]:
+    """
+    Get all scopes which are available in the system
+
+    :return: The scope catalog
+    :rtype: list[models.common.Scope]
+    """
+    scope_query = sqlalchemy.sql.select([database.tables.scopes])
+    scope_query_result = _read(scope_query).all()
+    scopes = [_scope_from_row(row) for row in scope_query_result]
+    for scope in scopes:
+        _cache_scope(scope)
+    return scopes
+
+
+def _scope_from_row(row) -> models.common.Scope:
     return models.common.Scope(
-        id=scope_query_result[0],
-        name=scope_query_result[1],
-        description=scope_query_result[2],
-        scope_string_value=scope_query_result[3],
+        id=row[0],
+        name=row[1],
+        description=row[2],
+        scope_string_value=row[3],
     )
 
 
+def _cache_scope(scope: models.common.Scope) -> None:
+    database.cache.scopes.set(("id", scope.id), scope)
+    database.cache.scopes.set(("value", scope.scope_string_value), scope)
+
+
+def _uncache_scope(scope: models.common.Scope) -> None:
+    database.cache.scopes.pop(("id", scope.id))
+    database.cache.scopes.pop(("value", scope.scope_string_value))
+
+
+@metrics.QUERY_DURATION.timed(query="get_user_scopes")
 def get_user_scopes(user: models.common.UserAccount) -> list[models.common.Scope]:
     scope_id_query = sqlalchemy.sql.select(
         [database.tables.account_scopes.c.scopeID],
         database.tables.account_scopes.c.accountID == user.id,
     )
-    scope_id_query_result = database.engine.execute(scope_id_query).all()
+    scope_id_query_result = _read(scope_id_query).all()
     scope_ids = [result[0] for result in scope_id_query_result]
     return [get_scope(scope_id) for scope_id in scope_ids]
 
 
+@metrics.QUERY_DURATION.timed(query="get_access_token_scopes")
 def get_access_token_scopes(token: models.common.TokenInformation) -> list[models.common.Scope]:
+    scope_ids = database.cache.access_token_scopes.get(token.id)
+    if scope_ids is None:
+        indexed_token = _lookup_indexed_token(token.value.get_secret_value())
+        if indexed_token is not None and indexed_token.token_id == token.id:
+            scope_ids = indexed_token.scope_ids
+    if scope_ids is None:
+        scope_id_query = sqlalchemy.sql.select(
+            [database.tables.access_token_scopes.c.scopeID],
+            database.tables.access_token_scopes.c.tokenID == token.id,
+        )
+        try:
+            scope_ids = tuple(result[0] for result in _read(scope_id_query).all())
+        except exceptions.DatabaseUnavailable as error:
+            scope_ids = _stale(
+                database.cache.access_token_scopes, "access_token_scopes", token.id, error
+            )
+        else:
+            database.cache.access_token_scopes.set(token.id, scope_ids)
+    return [get_scope(scope_id) for scope_id in scope_ids]
+
+
+@metrics.QUERY_DURATION.timed(query="get_access_token_scope_ids")
+def get_access_token_scope_ids(token_ids: typing.Iterable[int]) -> dict[int, tuple[int, ...]]:
+    """
+    Get the ids of the scopes associated to the specified access tokens in a single query
+
+    :param token_ids: The ids of the access tokens
+    :type token_ids: typing.Iterable[int]
+    :return: The ids of the scopes keyed by the id of the access token
+    :rtype: dict[int, tuple[int, ...]]
+    """
+    token_ids = list(token_ids)
     scope_id_query = sqlalchemy.sql.select(
-        [database.tables.access_token_scopes.c.scopeID],
-        database.tables.access_token_scopes.c.tokenID == token.id,
+        [
+            database.tables.access_token_scopes.c.tokenID,
+            database.tables.access_token_scopes.c.scopeID,
+        ],
+        database.tables.access_token_scopes.c.tokenID.in_(token_ids),
     )
-    scope_id_query_result = database.engine.execute(scope_id_query).all()
-    scope_ids = [result[0] for result in scope_id_query_result]
-    return [get_scope(scope_id) for scope_id in scope_ids]
+    scope_id_query_result = _read(scope_id_query).all()
+    scope_ids: dict[int, list[int]] = {token_id: [] for token_id in token_ids}
+    for token_id, scope_id in scope_id_query_result:
+        scope_ids[token_id].append(scope_id)
+    return {token_id: tuple(ids) for token_id, ids in scope_ids.items()}
 
 
+@metrics.QUERY_DURATION.timed(query="get_refresh_token_scopes")
 def get_refresh_token_scopes(token: models.common.TokenInformation) -> list[models.common.Scope]:
     scope_id_query = sqlalchemy.sql.select(
         [database.tables.refresh_token_scopes.c.scopeID],
         database.tables.refresh_token_scopes.c.tokenID == token.id,
     )
-    scope_id_query_result = database.engine.execute(scope_id_query).all()
+    scope_id_query_result = _read(scope_id_query).all()
     scope_ids = [result[0] for result in scope_id_query_result]
     return [get_scope(scope_id) for scope_id in scope_ids]
 
 
+@metrics.QUERY_DURATION.timed(query="store_changed_scope")
 def store_changed_scope(scope: models.common.Scope):
     update_scope_query = (
         sqlalchemy.sql.update(database.tables.scopes)
         .where(database.tables.scopes.c.id == scope.id)
         .values(name=scope.name, description=scope.description)
     )
-    database.engine.execute(update_scope_query)
+    try:
+        _execute_on_primary(update_scope_query)
+    finally:
+        _uncache_scope(scope)
 
 
+@metrics.QUERY_DURATION.timed(query="delete_scope")
 def delete_scope(scope: models.common.Scope):
     update_scope_query = sqlalchemy.sql.delete(database.tables.scopes).where(
         database.tables.scopes.c.id == scope.id
     )
-    database.engine.execute(update_scope_query)
+    try:
+        _execute_on_primary(update_scope_query)
+    finally:
+        _uncache_scope(scope)
 
 
+@metrics.QUERY_DURATION.timed(query="store_new_scope")
 def store_new_scope(scope_data: models.requests.ScopeCreationData):
     scope_insert_query = sqlalchemy.sql.insert(database.tables.scopes).values(
         name=scope_data.name,
         description=scope_data.description,
         value=scope_data.scope_string_value,
     )
-    database.engine.execute(scope_insert_query)
+    _execute_on_primary(scope_insert_query)
 
 
 # %% Operations for manipulating access tokens
+@metrics.QUERY_DURATION.timed(query="get_access_token_data")
 def get_access_token_data(identifier: typing.Union[str, int]):
     if type(identifier) is str:
+        token_hash = hashlib.sha3_224(identifier.encode("utf-8")).hexdigest()
+        cached_token = database.cache.access_tokens.get(token_hash)
+        if cached_token is not None:
+            return cached_token
+        indexed_token = _lookup_indexed_token(token_hash)
+        if indexed_token is not None:
+            # The index trails revocations by other services until the next reconciliation
+            if is_access_token_revoked(indexed_token.token_id):
+                return None
+            return models.common.TokenInformation(
+                id=indexed_token.token_id,
+                value=token_hash,
+                active=True,
+                expires=indexed_token.expires,
+                created=indexed_token.created,
+                owner_id=indexed_token.owner_id,
+            )
         access_token_query = sqlalchemy.sql.select(
             [database.tables.access_token],
-            database.tables.access_token.c.value
-            == hashlib.sha3_224(identifier.encode("utf-8")).hexdigest(),
+            database.tables.access_token.c.value == token_hash,
         )
     elif type(identifier) is int:
         access_token_query = sqlalchemy.sql.select(
@@ -140,19 +415,178 @@ def get_access_token_data(identifier: typing.Union[str, int]):
         )
     else:
         raise TypeError("Expected identifier to by either string or int")
-    access_token_query_result = database.engine.execute(access_token_query).first()
+    try:
+        access_token_query_result = _read_first(access_token_query)
+    except exceptions.DatabaseUnavailable as error:
+        if type(identifier) is not str:
+            raise
+        return _stale_access_token(token_hash, error)
     if access_token_query_result is None:
+        if type(identifier) is str:
+            # Keep the entry of a deleted token from being served during an outage
+            database.cache.access_tokens.pop(token_hash)
+        return None
+    token = _access_token_from_row(access_token_query_result)
+    database.cache.access_tokens.set(token.value.get_secret_value(), token)
+    return token
+
+
+def _stale_access_token(
+    token_hash: str, error: exceptions.DatabaseUnavailable
+) -> typing.Optional[models.common.TokenInformation]:
+    """
+    Get the expired cache entry of an access token during a database outage.
+
+    Tokens deleted by this service are removed from the cache immediately. The entries of tokens
+    which are known to be revoked, either by a cached revocation check or by their removal from the
+    token index, are removed here
+
+    :param token_hash: The hash of the token value
+    :type token_hash: str
+    :param error: The error raised since the database is unavailable
+    :type error: exceptions.DatabaseUnavailable
+    :return: The token or ``None`` if the token is known to be revoked
+    :rtype: typing.Optional[models.common.TokenInformation]
+    :raises exceptions.DatabaseUnavailable: No usable cache entry exists
+    """
+    grace_period = database.breaker.stale_grace_period
+    token = database.cache.access_tokens.get_stale(token_hash, grace_period)
+    if token is None:
+        raise error
+    # The lookup in the token index missed before, so a token below its high water mark has been
+    # removed from it
+    removed_from_index = token_index is not None and token.id <= token_index.high_water_mark
+    if removed_from_index or database.cache.revocations.get_stale(token.id, grace_period):
+        database.cache.access_tokens.pop(token_hash)
         return None
+    metrics.STALE_READS.inc(cache="access_tokens")
+    return token
+
+
+@metrics.QUERY_DURATION.timed(query="is_access_token_revoked")
+def is_access_token_revoked(token_id: int) -> bool:
+    """
+    Check if an access token has been revoked, i.e. it was deleted or deactivated
+
+    :param token_id: The id of the access token
+    :type token_id: int
+    :return: ``True`` if the token may not be used anymore
+    :rtype: bool
+    """
+    revoked = database.cache.revocations.get(token_id)
+    if revoked is not None:
+        return revoked
+    revocation_query = sqlalchemy.sql.select(
+        [database.tables.access_token.c.active],
+        database.tables.access_token.c.id == token_id,
+    )
+    # A token missing on the read replica may just have been issued, so the verdict is only
+    # cached once the primary database confirmed it
+    try:
+        revocation_query_result = _read_first(revocation_query)
+    except exceptions.DatabaseUnavailable as error:
+        return _stale(database.cache.revocations, "revocations", token_id, error)
+    revoked = revocation_query_result is None or not revocation_query_result[0]
+    database.cache.revocations.set(token_id, revoked)
+    return revoked
+
+
+@metrics.QUERY_DURATION.timed(query="get_recent_access_tokens")
+def get_recent_access_tokens(limit: int) -> list[models.common.TokenInformation]:
+    """
+    Get the most recently created access tokens which are not expired yet
+
+    :param limit: The maximal number of access tokens returned
+    :type limit: int
+    :return: The access tokens ordered by their creation time (newest first)
+    :rtype: list[models.common.TokenInformation]
+    """
+    access_token_query = (
+        sqlalchemy.sql.select(
+            [database.tables.access_token],
+            database.tables.access_token.c.expires > sqlalchemy.sql.func.now(),
+        )
+        .order_by(database.tables.access_token.c.created.desc())
+        .limit(limit)
+    )
+    access_token_query_result = _read(access_token_query).all()
+    return [_access_token_from_row(row) for row in access_token_query_result]
+
+
+def _lookup_indexed_token(token_hash: str) -> typing.Optional[tokenindex.IndexedToken]:
+    """Look up an access token by the hex digest of its value in the token index"""
+    if token_index is None:
+        return None
+    indexed_token = token_index.lookup(bytes.fromhex(token_hash))
+    metrics.TOKEN_INDEX_LOOKUPS.inc(result="miss" if indexed_token is None else "hit")
+    return indexed_token
+
+
+@metrics.QUERY_DURATION.timed(query="get_access_tokens_after")
+def get_access_tokens_after(token_id: int, limit: int) -> list[models.common.TokenInformation]:
+    """
+    Get the access tokens created after the specified one, i.e. which have a higher id
+
+    :param token_id: The highest id which is already known
+    :type token_id: int
+    :param limit: The maximal number of access tokens returned
+    :type limit: int
+    :return: The access tokens ordered by their id
+    :rtype: list[models.common.TokenInformation]
+    """
+    access_token_query = (
+        sqlalchemy.sql.select(
+            [database.tables.access_token],
+            database.tables.access_token.c.id > token_id,
+        )
+        .order_by(database.tables.access_token.c.id)
+        .limit(limit)
+    )
+    access_token_query_result = _read(access_token_query).all()
+    return [_access_token_from_row(row) for row in access_token_query_result]
+
+
+@metrics.QUERY_DURATION.timed(query="get_active_access_token_ids")
+def get_active_access_token_ids(token_ids: typing.Iterable[int]) -> set[int]:
+    """
+    Get the ids of the access tokens which still exist and are active
+
+    :param token_ids: The ids of the access tokens which shall be checked
+    :type token_ids: typing.Iterable[int]
+    :return: The ids of the access tokens which exist and are active
+    :rtype: set[int]
+    """
+    active_token_query = sqlalchemy.sql.select(
+        [database.tables.access_token.c.id],
+        sqlalchemy.and_(
+            database.tables.access_token.c.id.in_(list(token_ids)),
+            database.tables.access_token.c.active,
+        ),
+    )
+    return {result[0] for result in _read(active_token_query).all()}
+
+
+def _access_token_from_row(row) -> models.common.TokenInformation:
     return models.common.TokenInformation(
-        id=access_token_query_result[0],
-        value=access_token_query_result[1],
-        active=access_token_query_result[2],
-        expires=access_token_query_result[3],
-        created=access_token_query_result[4],
-        owner_id=access_token_query_result[5],
+        id=row[0],
+        value=row[1],
+        active=row[2],
+        expires=_as_aware(row[3]),
+        created=_as_aware(row[4]),
+        owner_id=row[5],
     )
 
 
+def _as_aware(
+    timestamp: typing.Optional[datetime.datetime],
+) -> typing.Optional[datetime.datetime]:
+    """Interpret timestamps returned without a time zone (e.g. by SQLite) as UTC"""
+    if timestamp is not None and timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+
+@metrics.QUERY_DURATION.timed(query="get_refresh_token_data")
 def get_refresh_token_data(identifier: typing.Union[str, int]):
     if type(identifier) is str:
         access_token_query = sqlalchemy.sql.select(
@@ -167,41 +601,348 @@ def get_refresh_token_data(identifier: typing.Union[str, int]):
         )
     else:
         raise TypeError("Expected identifier to by either string or int")
-    access_token_query_result = database.engine.execute(access_token_query).first()
+    access_token_query_result = _read_first(access_token_query)
     if access_token_query_result is None:
         return None
     return models.common.TokenInformation(
         id=access_token_query_result[0],
         value=access_token_query_result[1],
         active=access_token_query_result[2],
-        expires=access_token_query_result[3],
+        expires=_as_aware(access_token_query_result[3]),
         owner_id=access_token_query_result[4],
     )
 
 
+@metrics.QUERY_DURATION.timed(query="delete_access_token")
 def delete_access_token(token: models.common.TokenInformation):
     delete_access_token_query = sqlalchemy.sql.delete(database.tables.access_token).where(
         database.tables.access_token.c.id == token.id,
     )
-    database.engine.execute(delete_access_token_query)
+    _execute_on_primary(delete_access_token_query)
+    database.cache.access_tokens.pop(token.value.get_secret_value())
+    database.cache.access_token_scopes.pop(token.id)
+    database.cache.revocations.set(token.id, True)
+    if token_index is not None:
+        token_index.remove([bytes.fromhex(token.value.get_secret_value())])
 
 
+@metrics.QUERY_DURATION.timed(query="delete_refresh_token")
 def delete_refresh_token(token: models.common.TokenInformation):
     delete_refresh_token_query = sqlalchemy.sql.delete(database.tables.refresh_token).where(
         database.tables.refresh_token.c.id == token.id
     )
-    database.engine.execute(delete_refresh_token_query)
+    _execute_on_primary(delete_refresh_token_query)
 
 
+@metrics.QUERY_DURATION.timed(query="delete_all_access_tokens")
 def delete_all_access_tokens(user: models.common.UserAccount):
     delete_access_token_query = sqlalchemy.sql.delete(database.tables.access_token).where(
         database.tables.access_token.c.accountID == user.id,
     )
-    database.engine.execute(delete_access_token_query)
+    _execute_on_primary(delete_access_token_query)
+    # The cached tokens are not indexed by their owner
+    database.cache.access_tokens.clear()
+    database.cache.revocations.clear()
+    if token_index is not None:
+        token_index.remove_owner(user.id)
 
 
+@metrics.QUERY_DURATION.timed(query="delete_all_refresh_tokens")
 def delete_all_refresh_tokens(user: models.common.UserAccount):
     delete_refresh_token_query = sqlalchemy.sql.delete(database.tables.refresh_token).where(
         database.tables.refresh_token.c.accountID == user.id,
     )
-    database.engine.execute(delete_refresh_token_query)
+    _execute_on_primary(delete_refresh_token_query)
+
+
+@metrics.QUERY_DURATION.timed(query="delete_expired_access_tokens")
+def delete_expired_access_tokens(batch_size: int) -> tuple[int, int]:
+    """
+    Delete a batch of expired access tokens and the scopes associated to them
+
+    :param batch_size: The maximal number of access tokens deleted in this batch
+    :type batch_size: int
+    :return: The number of deleted access tokens and the number of deleted scope associations
+    :rtype: tuple[int, int]
+    """
+    expired_token_query = sqlalchemy.sql.select(
+        [database.tables.access_token.c.id],
+        database.tables.access_token.c.expires < sqlalchemy.sql.func.now(),
+    ).limit(batch_size)
+    with _transaction_on_primary() as connection:
+        token_ids = [result[0] for result in connection.execute(expired_token_query).all()]
+        if len(token_ids) == 0:
+            return 0, 0
+        delete_scopes_query = sqlalchemy.sql.delete(database.tables.access_token_scopes).where(
+            database.tables.access_token_scopes.c.tokenID.in_(token_ids)
+        )
+        deleted_scopes = connection.execute(delete_scopes_query).rowcount
+        delete_tokens_query = sqlalchemy.sql.delete(database.tables.access_token).where(
+            database.tables.access_token.c.id.in_(token_ids)
+        )
+        deleted_tokens = connection.execute(delete_tokens_query).rowcount
+    return deleted_tokens, deleted_scopes
+
+
+@metrics.QUERY_DURATION.timed(query="delete_expired_refresh_tokens")
+def delete_expired_refresh_tokens(batch_size: int) -> tuple[int, int]:
+    """
+    Delete a batch of expired refresh tokens and the scopes associated to them
+
+    :param batch_size: The maximal number of refresh tokens deleted in this batch
+    :type batch_size: int
+    :return: The number of deleted refresh tokens and the number of deleted scope associations
+    :rtype: tuple[int, int]
+    """
+    expired_token_query = sqlalchemy.sql.select(
+        [database.tables.refresh_token.c.id],
+        database.tables.refresh_token.c.expires < sqlalchemy.sql.func.now(),
+    ).limit(batch_size)
+    with _transaction_on_primary() as connection:
+        token_ids = [result[0] for result in connection.execute(expired_token_query).all()]
+        if len(token_ids) == 0:
+            return 0, 0
+        delete_scopes_query = sqlalchemy.sql.delete(database.tables.refresh_token_scopes).where(
+            database.tables.refresh_token_scopes.c.tokenID.in_(token_ids)
+        )
+        deleted_scopes = connection.execute(delete_scopes_query).rowcount
+        delete_tokens_query = sqlalchemy.sql.delete(database.tables.refresh_token).where(
+            database.tables.refresh_token.c.id.in_(token_ids)
+        )
+        deleted_tokens = connection.execute(delete_tokens_query).rowcount
+    return deleted_tokens, deleted_scopes
+
+
+# %% Operations for the membership of the service replicas
+@metrics.QUERY_DURATION.timed(query="store_replica_heartbeat")
+def store_replica_heartbeat(replica_id: str) -> None:
+    """
+    Record that the replica is alive
+
+    :param replica_id: The identifier of the replica
+    :type replica_id: str
+    """
+    # The heartbeats use the clock of the database, which all replicas share
+    update_heartbeat_query = (
+        sqlalchemy.sql.update(database.tables.service_replicas)
+        .where(database.tables.service_replicas.c.id == replica_id)
+        .values(lastSeen=sqlalchemy.sql.func.now())
+    )
+    if _execute_on_primary(update_heartbeat_query).rowcount == 0:
+        insert_heartbeat_query = sqlalchemy.sql.insert(database.tables.service_replicas).values(
+            id=replica_id, lastSeen=sqlalchemy.sql.func.now()
+        )
+        _execute_on_primary(insert_heartbeat_query)
+
+
+@metrics.QUERY_DURATION.timed(query="get_live_replicas")
+def get_live_replicas(timeout: float) -> list[str]:
+    """
+    Get the replicas which recorded a heartbeat recently
+
+    :param timeout: The number of seconds after which a replica without heartbeat is considered
+        dead
+    :type timeout: float
+    :return: The identifiers of the live replicas
+    :rtype: list[str]
+    """
+    replica_query = sqlalchemy.sql.select(
+        [database.tables.service_replicas.c.id],
+        database.tables.service_replicas.c.lastSeen
+        >= sqlalchemy.sql.func.now() - datetime.timedelta(seconds=timeout),
+    )
+    return [result[0] for result in _execute_on_primary(replica_query).all()]
+
+
+@metrics.QUERY_DURATION.timed(query="delete_replica")
+def delete_replica(replica_id: str) -> None:
+    """
+    Remove the replica from the membership
+
+    :param replica_id: The identifier of the replica
+    :type replica_id: str
+    """
+    delete_replica_query = sqlalchemy.sql.delete(database.tables.service_replicas).where(
+        database.tables.service_replicas.c.id == replica_id
+    )
+    _execute_on_primary(delete_replica_query)
+
+
+# %% Operations for the account snapshots
+@metrics.QUERY_DURATION.timed(query="get_account_snapshot")
+def get_account_snapshot(account_id: int) -> typing.Optional[models.common.AccountSnapshot]:
+    """
+    Get the authorization snapshot of the account
+
+    :param account_id: The id of the account
+    :type account_id: int
+    :return: The snapshot or ``None`` if the account does not exist (anymore)
+    :rtype: typing.Optional[models.common.AccountSnapshot]
+    """
+    snapshot = database.cache.account_snapshots.get(account_id)
+    if snapshot is None:
+        snapshot_query = sqlalchemy.sql.select(
+            [database.tables.account_snapshots],
+            database.tables.account_snapshots.c.accountID == account_id,
+        )
+        try:
+            snapshot_query_result = _read_first(snapshot_query)
+        except exceptions.DatabaseUnavailable as error:
+            snapshot = _stale(
+                database.cache.account_snapshots, "account_snapshots", account_id, error
+            )
+        else:
+            if snapshot_query_result is None:
+                return None
+            snapshot = _account_snapshot_from_row(snapshot_query_result)
+            database.cache.account_snapshots.set(account_id, snapshot)
+    return None if snapshot.deleted else snapshot
+
+
+@metrics.QUERY_DURATION.timed(query="get_changed_account_snapshots")
+def get_changed_account_snapshots(since_version: int) -> list[models.common.AccountSnapshot]:
+    """
+    Get the account snapshots which changed after the specified version
+
+    :param since_version: The last version which is already known
+    :type since_version: int
+    :return: The changed snapshots ordered by their version
+    :rtype: list[models.common.AccountSnapshot]
+    """
+    snapshot_query = sqlalchemy.sql.select(
+        [database.tables.account_snapshots],
+        database.tables.account_snapshots.c.version > since_version,
+    ).order_by(database.tables.account_snapshots.c.version)
+    return [_account_snapshot_from_row(row) for row in _read(snapshot_query).all()]
+
+
+@metrics.QUERY_DURATION.timed(query="get_latest_account_snapshot_version")
+def get_latest_account_snapshot_version() -> int:
+    """
+    Get the highest version of all account snapshots
+
+    :return: The highest version or ``0`` if no snapshot exists
+    :rtype: int
+    """
+    version_query = sqlalchemy.sql.select(
+        [sqlalchemy.func.max(database.tables.account_snapshots.c.version)]
+    )
+    latest_version = _read(version_query).scalar()
+    return 0 if latest_version is None else latest_version
+
+
+@metrics.QUERY_DURATION.timed(query="get_accounts_without_snapshot")
+def get_accounts_without_snapshot(limit: int) -> list[int]:
+    """
+    Get the ids of accounts for which no snapshot has been created yet
+
+    :param limit: The maximal number of returned ids
+    :type limit: int
+    :return: The ids of the accounts
+    :rtype: list[int]
+    """
+    account_query = (
+        sqlalchemy.sql.select(
+            [database.tables.accounts.c.id],
+            database.tables.accounts.c.id.not_in(
+                sqlalchemy.sql.select([database.tables.account_snapshots.c.accountID])
+            ),
+        )
+        .order_by(database.tables.accounts.c.id)
+        .limit(limit)
+    )
+    return [result[0] for result in _execute_on_primary(account_query).all()]
+
+
+@metrics.QUERY_DURATION.timed(query="refresh_account_snapshots")
+def refresh_account_snapshots(account_ids: list[int]) -> None:
+    """
+    Recalculate the snapshots of the accounts from the accounts.
+
+    On PostgreSQL the snapshots are kept up to date by a trigger and this is only needed to create
+    the snapshots of accounts which existed before the trigger was installed
+
+    :param account_ids: The ids of the accounts whose snapshots are recalculated
+    :type account_ids: list[int]
+    """
+    if len(account_ids) == 0:
+        return
+    accounts = database.tables.accounts
+    account_snapshots = database.tables.account_snapshots
+    with _transaction_on_primary() as connection:
+        account_rows = connection.execute(
+            sqlalchemy.sql.select([accounts], accounts.c.id.in_(account_ids))
+        ).all()
+        version = _next_account_snapshot_version(connection)
+        snapshot_rows = [
+            {
+                "accountID": row.id,
+                "version": version,
+                "active": row.active,
+                "deleted": False,
+                "username": row.username,
+                "firstName": row.firstName,
+                "lastName": row.lastName,
+            }
+            for row in account_rows
+        ]
+        # Accounts which no longer exist are kept as deleted snapshots
+        existing_account_ids = {row.id for row in account_rows}
+        snapshot_rows.extend(
+            {
+                "accountID": account_id,
+                "version": version,
+                "active": False,
+                "deleted": True,
+                "username": None,
+                "firstName": None,
+                "lastName": None,
+            }
+            for account_id in account_ids
+            if account_id not in existing_account_ids
+        )
+        connection.execute(
+            sqlalchemy.sql.delete(account_snapshots).where(
+                account_snapshots.c.accountID.in_(account_ids)
+            )
+        )
+        connection.execute(sqlalchemy.sql.insert(account_snapshots), snapshot_rows)
+
+
+def _next_account_snapshot_version(connection: sqlalchemy.engine.Connection) -> int:
+    """Get a new version for account snapshots inside the transaction of the connection"""
+    if connection.dialect.supports_sequences:
+        return connection.execute(
+            sqlalchemy.sql.select([database.tables.account_snapshot_versions.next_value()])
+        ).scalar()
+    latest_version = connection.execute(
+        sqlalchemy.sql.select([sqlalchemy.func.max(database.tables.account_snapshots.c.version)])
+    ).scalar()
+    return 1 if latest_version is None else latest_version + 1
+
+
+def _account_snapshot_from_row(row) -> models.common.AccountSnapshot:
+    return models.common.AccountSnapshot(
+        account_id=row.accountID,
+        version=row.version,
+        active=row.active,
+        deleted=row.deleted,
+        username=row.username,
+        first_name=row.firstName,
+        last_name=row.lastName,
+    )
+
+
+# %% Operations for the audit log
+@metrics.QUERY_DURATION.timed(query="store_audit_records")
+def store_audit_records(records: list[dict]) -> None:
+    """
+    Store a batch of introspection audit records using a single multi-row insert
+
+    :param records: The rows of the ``introspectionAudit`` table
+    :type records: list[dict]
+    """
+    if len(records) == 0:
+        return
+    audit_insert_query = sqlalchemy.sql.insert(database.tables.introspection_audit).values(records)
+    _execute_on_primary(audit_insert_query)
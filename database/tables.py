@@ -95,6 +95,115 @@ account_roles = sqlalchemy.Table(
     sqlalchemy.Column("scopeID", None, sqlalchemy.ForeignKey("roles.id", **__fk_options)),
 )
 
+service_replicas = sqlalchemy.Table(
+    "serviceReplicas",
+    __metadata,
+    sqlalchemy.Column("id", sqlalchemy.String(length=255), primary_key=True),
+    sqlalchemy.Column("lastSeen", sqlalchemy.TIMESTAMP(timezone=True), nullable=False),
+)
+
+introspection_audit = sqlalchemy.Table(
+    "introspectionAudit",
+    __metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
+    sqlalchemy.Column("timestamp", sqlalchemy.TIMESTAMP(timezone=True), nullable=False),
+    sqlalchemy.Column("tokenID", sqlalchemy.Integer),
+    sqlalchemy.Column("accountID", sqlalchemy.Integer),
+    sqlalchemy.Column("requiredScopes", sqlalchemy.Text),
+    sqlalchemy.Column("active", sqlalchemy.Boolean, nullable=False),
+    sqlalchemy.Column("reason", sqlalchemy.String(length=64)),
+)
+
+account_snapshots = sqlalchemy.Table(
+    "accountSnapshots",
+    __metadata,
+    sqlalchemy.Column("accountID", sqlalchemy.Integer, primary_key=True, autoincrement=False),
+    sqlalchemy.Column("version", sqlalchemy.BigInteger, nullable=False, index=True),
+    sqlalchemy.Column("active", sqlalchemy.Boolean, nullable=False),
+    sqlalchemy.Column("deleted", sqlalchemy.Boolean, nullable=False, default=False),
+    sqlalchemy.Column("username", sqlalchemy.String(length=255)),
+    sqlalchemy.Column("firstName", sqlalchemy.String(length=255)),
+    sqlalchemy.Column("lastName", sqlalchemy.String(length=255)),
+)
+"""
+The denormalized state of every account used to validate the token owners. Deleted accounts keep
+a row with the ``deleted`` flag set, so the change is visible by its version
+"""
+
+account_snapshot_versions = sqlalchemy.Sequence("accountSnapshotVersions", metadata=__metadata)
+"""The sequence issuing the versions of the account snapshots"""
+
+account_snapshot_triggers = sqlalchemy.DDL(
+    """
+DROP TRIGGER IF EXISTS account_snapshot ON "authorization"."accountScopes";
+DROP TRIGGER IF EXISTS account_snapshot ON "authorization"."accountRoles";
+DROP TRIGGER IF EXISTS account_snapshot ON "authorization"."roleScopes";
+DROP TRIGGER IF EXISTS account_snapshot ON "authorization".scopes;
+DROP FUNCTION IF EXISTS "authorization".account_snapshot_on_role_scope_change();
+DROP FUNCTION IF EXISTS "authorization".account_snapshot_on_scope_change();
+ALTER TABLE "authorization"."accountSnapshots" DROP COLUMN IF EXISTS "scopes";
+
+CREATE OR REPLACE FUNCTION "authorization".refresh_account_snapshot(target_account integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO "authorization"."accountSnapshots"
+        ("accountID", "version", "active", "deleted", "username", "firstName", "lastName")
+    SELECT
+        account.id,
+        nextval('"authorization"."accountSnapshotVersions"'),
+        account.active,
+        false,
+        account.username,
+        account."firstName",
+        account."lastName"
+    FROM "authorization".accounts AS account
+    WHERE account.id = target_account
+    ON CONFLICT ("accountID") DO UPDATE SET
+        "version" = excluded."version",
+        "active" = excluded."active",
+        "deleted" = false,
+        "username" = excluded."username",
+        "firstName" = excluded."firstName",
+        "lastName" = excluded."lastName";
+    IF NOT FOUND THEN
+        UPDATE "authorization"."accountSnapshots"
+        SET "version" = nextval('"authorization"."accountSnapshotVersions"'),
+            "active" = false,
+            "deleted" = true
+        WHERE "accountID" = target_account AND NOT "deleted";
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION "authorization".account_snapshot_on_account_change()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM "authorization".refresh_account_snapshot(OLD.id);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM "authorization".refresh_account_snapshot(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS account_snapshot ON "authorization".accounts;
+CREATE TRIGGER account_snapshot
+AFTER INSERT OR UPDATE OR DELETE ON "authorization".accounts
+FOR EACH ROW EXECUTE FUNCTION "authorization".account_snapshot_on_account_change();
+"""
+).execute_if(dialect="postgresql")
+"""
+The PostgreSQL functions and trigger maintaining the account snapshots on every change of the
+accounts. The statements are idempotent and also remove the objects of earlier versions, but take
+exclusive locks on the tables. Therefore they are only executed by the migration in
+tasks.snapshots and not at the startup of the service. Other databases rely on
+database.crud.refresh_account_snapshots
+"""
+
+sqlalchemy.event.listen(__metadata, "after_create", account_snapshot_triggers)
+
 
 def initialize() -> None:
     """
@@ -24,3 +24,15 @@ class ServiceException(Exception):
         self.error_name = error_name
         self.error_description = error_description
         self.http_code = status_code
+
+
+class DatabaseUnavailable(ServiceException):
+    """The database is unreachable or the circuit breaker guarding it is open"""
+
+    def __init__(self):
+        super().__init__(
+            error_code="DATABASE_UNAVAILABLE",
+            error_name="Database unavailable",
+            error_description="The database is currently unavailable. Please retry later",
+            status_code=http.HTTPStatus.SERVICE_UNAVAILABLE,
+        )
@@ -0,0 +1,275 @@
+"""Lightweight metrics about the request processing served in the Prometheus text format"""
+import bisect
+import contextlib
+import functools
+import http
+import http.server
+import logging
+import threading
+import time
+import typing
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+"""The default upper bounds (in seconds) of the histogram buckets"""
+
+_registry: list[typing.Union["Counter", "Histogram"]] = []
+"""All metrics which are served by the metrics endpoint"""
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], **extra) -> str:
+    labels = list(zip(label_names, label_values)) + list(extra.items())
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """A monotonically increasing counter which is partitioned by a fixed set of labels"""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        """
+        Create and register a new counter
+
+        :param name: The name of the counter
+        :type name: str
+        :param description: The description of the counter
+        :type description: str
+        :param label_names: The names of the labels partitioning the counter
+        :type label_names: tuple[str, ...]
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increment the counter for the specified label values"""
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Get the current value of the counter for the specified label values"""
+        return self._values.get(tuple(labels[name] for name in self.label_names), 0.0)
+
+    def render(self) -> list[str]:
+        """Render the counter in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """A histogram of observed durations which is partitioned by a fixed set of labels"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _DEFAULT_BUCKETS,
+    ):
+        """
+        Create and register a new histogram
+
+        :param name: The name of the histogram
+        :type name: str
+        :param description: The description of the histogram
+        :type description: str
+        :param label_names: The names of the labels partitioning the histogram
+        :type label_names: tuple[str, ...]
+        :param buckets: The upper bounds of the buckets in ascending order
+        :type buckets: tuple[float, ...]
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # Every entry holds the bucket counts, the sum and the count of the observations
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for the specified label values"""
+        key = tuple(labels[name] for name in self.label_names)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bucket] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> typing.Iterator[None]:
+        """Observe the duration of the wrapped block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels: str) -> typing.Callable:
+        """Decorator observing the duration of every call of the decorated function"""
+
+        def decorator(function: typing.Callable) -> typing.Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+
+            return wrapper
+
+        return decorator
+
+    def render(self) -> list[str]:
+        """Render the histogram in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative_count += bucket_count
+                    labels = _format_labels(self.label_names, key, le=upper_bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+                labels = _format_labels(self.label_names, key, le="+Inf")
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render() -> str:
+    """Render all registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler serving the rendered metrics on ``/metrics``"""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(http.HTTPStatus.NOT_FOUND)
+            return
+        content = render().encode("utf-8")
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        _logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def start_http_server(host: str, port: int) -> http.server.ThreadingHTTPServer:
+    """
+    Serve the metrics on ``http://<host>:<port>/metrics`` in a background thread
+
+    :param host: The address the metrics endpoint is bound to
+    :type host: str
+    :param port: The port the metrics endpoint is bound to
+    :type port: int
+    :return: The running http server
+    :rtype: http.server.ThreadingHTTPServer
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    _logger.info("Serving the metrics on http://%s:%s/metrics", host, port)
+    return server
+
+
+STAGE_DURATION = Histogram(
+    "authorization_executor_stage_duration_seconds",
+    "The time spent in the stages of the message executor",
+    ("stage",),
+)
+"""The time spent in the stages of the message executor"""
+
+QUERY_DURATION = Histogram(
+    "authorization_query_duration_seconds",
+    "The time spent in the database operations (including cache lookups)",
+    ("query",),
+)
+"""The time spent in the database operations"""
+
+REQUESTS = Counter(
+    "authorization_requests_total",
+    "The handled requests by action and token introspection failure reason",
+    ("action", "reason"),
+)
+"""The handled requests by action and token introspection failure reason"""
+
+ERRORS = Counter(
+    "authorization_errors_total",
+    "The requests answered with an error by action and error code",
+    ("action", "error"),
+)
+"""The requests answered with an error by action and error code"""
+
+SHED_REQUESTS = Counter(
+    "authorization_shed_requests_total",
+    "The requests rejected by the admission control by reason",
+    ("reason",),
+)
+"""The requests rejected by the admission control by reason"""
+
+BREAKER_TRANSITIONS = Counter(
+    "authorization_breaker_transitions_total",
+    "The transitions of the database circuit breaker by the state entered",
+    ("state",),
+)
+"""The transitions of the database circuit breaker by the state entered"""
+
+STALE_READS = Counter(
+    "authorization_stale_reads_total",
+    "The cached query results served after their time to live since the database is unavailable",
+    ("cache",),
+)
+"""The cached query results served after their time to live since the database is unavailable"""
+
+AUDIT_RECORDS = Counter(
+    "authorization_audit_records_total",
+    "The introspection audit records by their state (written, dropped or failed)",
+    ("state",),
+)
+"""The introspection audit records by their state (written, dropped or failed)"""
+
+TOKEN_INDEX_LOOKUPS = Counter(
+    "authorization_token_index_lookups_total",
+    "The lookups in the local token index by their result (hit or miss)",
+    ("result",),
+)
+"""The lookups in the local token index by their result (hit or miss)"""
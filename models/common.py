@@ -61,3 +61,27 @@ class TokenInformation(models.BaseModel):
 
     owner_id: int = pydantic.Field(default=...)
     """The id of the account this token is associated to"""
+
+
+class AccountSnapshot(models.BaseModel):
+
+    account_id: int = pydantic.Field(default=...)
+    """The internal database id of the account"""
+
+    version: int = pydantic.Field(default=...)
+    """The version of the snapshot which increases with every change"""
+
+    active: bool = pydantic.Field(default=...)
+    """Indicator if the account is active"""
+
+    deleted: bool = pydantic.Field(default=False)
+    """Indicator if the account has been deleted"""
+
+    username: typing.Optional[str] = pydantic.Field(default=None)
+    """The username of the account"""
+
+    first_name: typing.Optional[str] = pydantic.Field(default=None)
+    """The first name of the user who is the owner of the account"""
+
+    last_name: typing.Optional[str] = pydantic.Field(default=None)
+    """The last name of the user who is the owner of the account"""
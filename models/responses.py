@@ -37,6 +37,12 @@ class TokenIntrospection(BaseModel):
 
     user: typing.Optional[UserAccount] = pydantic.Field(default=None, alias="user")
 
+    _token_id: typing.Optional[int] = pydantic.PrivateAttr(default=None)
+    """The database id of the introspected token (not part of the reply)"""
+
+    _account_id: typing.Optional[int] = pydantic.PrivateAttr(default=None)
+    """The id of the account owning the introspected token (not part of the reply)"""
+
     @pydantic.validator("scope")
     def convert_scope_list_to_string(cls, v):
         if type(v) is list:
@@ -0,0 +1,150 @@
+"""Opt-in profiling of the running service for diagnosing latency regressions in production"""
+import collections
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import typing
+
+_logger = logging.getLogger(__name__)
+
+
+class CallProfiler:
+    """
+    Deterministic profiler which profiles every n-th call of the wrapped function and aggregates
+    the statistics into a single file
+    """
+
+    def __init__(self, every_nth_call: int, output_directory: str, dump_every: int = 100):
+        """
+        Create a new call profiler
+
+        :param every_nth_call: Profile every n-th call of the wrapped function
+        :type every_nth_call: int
+        :param output_directory: The directory into which the statistics are written
+        :type output_directory: str
+        :param dump_every: Write the aggregated statistics after this many profiled calls
+        :type dump_every: int
+        """
+        self.every_nth_call = every_nth_call
+        self.dump_every = dump_every
+        self.output_file = os.path.join(output_directory, f"calls-{os.getpid()}.prof")
+        self._call_counter = itertools.count(1)
+        self._profiled_calls = 0
+        self._statistics: typing.Optional[pstats.Stats] = None
+        # Only a single profiler may be active at once
+        self._profiler_lock = threading.Lock()
+
+    def wrap(self, function: typing.Callable) -> typing.Callable:
+        """
+        Wrap the function to profile every n-th call of it
+
+        :param function: The function which shall be profiled
+        :type function: typing.Callable
+        :return: The wrapped function
+        :rtype: typing.Callable
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if next(self._call_counter) % self.every_nth_call != 0:
+                return function(*args, **kwargs)
+            if not self._profiler_lock.acquire(blocking=False):
+                return function(*args, **kwargs)
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    return profiler.runcall(function, *args, **kwargs)
+                finally:
+                    self._add_statistics(profiler)
+            finally:
+                self._profiler_lock.release()
+
+        return wrapper
+
+    def _add_statistics(self, profiler: cProfile.Profile) -> None:
+        if self._statistics is None:
+            self._statistics = pstats.Stats(profiler)
+        else:
+            self._statistics.add(profiler)
+        self._profiled_calls += 1
+        if self._profiled_calls % self.dump_every == 0:
+            self._statistics.dump_stats(self.output_file)
+            _logger.info(
+                "Wrote the statistics of %s profiled calls to %s",
+                self._profiled_calls,
+                self.output_file,
+            )
+
+    def dump(self) -> None:
+        """Write the aggregated statistics to the output file"""
+        with self._profiler_lock:
+            if self._statistics is not None:
+                self._statistics.dump_stats(self.output_file)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler which periodically samples the stacks of all threads for a fixed window
+    and writes the aggregated stacks in the collapsed format used by flame graph tools
+    """
+
+    def __init__(self, window: float, sample_interval: float, output_directory: str):
+        """
+        Create a new sampling profiler
+
+        :param window: The number of seconds the stacks are sampled for
+        :type window: float
+        :param sample_interval: The number of seconds between two samples
+        :type sample_interval: float
+        :param output_directory: The directory into which the aggregated stacks are written
+        :type output_directory: str
+        """
+        self.window = window
+        self.sample_interval = sample_interval
+        self.output_directory = output_directory
+        self._sampler: typing.Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """
+        Start sampling in a background thread. This is safe to call from a signal handler
+
+        :return: ``False`` if a sampling window is already running
+        :rtype: bool
+        """
+        if self._sampler is not None and self._sampler.is_alive():
+            return False
+        self._sampler = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample(self) -> None:
+        _logger.info("Sampling the stacks of all threads for %ss", self.window)
+        own_thread_id = threading.get_ident()
+        stacks: collections.Counter[str] = collections.Counter()
+        sample_count = 0
+        deadline = time.monotonic() + self.window
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+            sample_count += 1
+            time.sleep(self.sample_interval)
+        output_file = os.path.join(
+            self.output_directory, f"samples-{os.getpid()}-{int(time.time())}.txt"
+        )
+        with open(output_file, "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        _logger.info("Wrote %s samples to %s", sample_count, output_file)
@@ -1,5 +1,7 @@
 """The module containing functions for the AMQP server"""
+import functools
 import http
+import typing
 
 import sqlalchemy.exc
 import ujson
@@ -7,125 +9,224 @@ import logging
 
 import pydantic.error_wrappers
 
+import admission
+import audit
 import database.crud
 import database.tables
 import exceptions
+import metrics
 import models.requests
 import models.responses
 import settings
 import tools
+import wire
 
 _content_validation_logger = logging.getLogger("content_validation")
 _executor_logger = logging.getLogger("executor")
 
 
+@functools.lru_cache(maxsize=None)
+def _service_name() -> str:
+    """Get the name of the service used as prefix of the error codes"""
+    return settings.ServiceConfiguration().name
+
+
+@functools.lru_cache(maxsize=None)
+def _admission_controller() -> admission.AdmissionController:
+    """Get the admission control shedding messages while the service is overloaded"""
+    _admission_settings = settings.AdmissionConfiguration()
+    return admission.AdmissionController(
+        max_in_flight=_admission_settings.max_in_flight,
+        max_queue_time=_admission_settings.max_queue_time,
+    )
+
+
+audit_log: typing.Optional[audit.AuditLog] = None
+"""The audit log recording the token introspections (set by the service if enabled)"""
+
+
+def _decode(message: bytes) -> typing.Any:
+    """Decode a JSON or MessagePack encoded message"""
+    if wire.is_msgpack(message):
+        return wire.decode_request(message)
+    return ujson.loads(message)
+
+
 def content_validator(message: bytes) -> bool:
     """Check if the content is parseable into the incoming request model"""
     try:
-        request = models.requests.IncomingRequest.parse_obj({"payload": ujson.loads(message)})
+        request = models.requests.IncomingRequest.parse_obj({"payload": _decode(message)})
     except pydantic.ValidationError as e:
         _content_validation_logger.critical("Rejected message", exc_info=e)
         return False
     return True
 
 
+def _encode(content: dict, binary: bool = False, **kwargs) -> bytes:
+    """Serialize the response content and record the time spent doing so"""
+    with metrics.STAGE_DURATION.time(stage="serialize"):
+        if binary:
+            return wire.encode(content)
+        return ujson.dumps(content, **kwargs).encode("utf-8")
+
+
+def _error_response(
+    binary: bool,
+    action: str,
+    http_code: http.HTTPStatus,
+    error_code: str,
+    error_name: typing.Optional[str],
+    error_description: typing.Optional[str],
+) -> bytes:
+    """Build the error envelope sent back to the caller and count the error"""
+    metrics.ERRORS.inc(action=action, error=error_code)
+    content = {
+        "httpCode": http_code.value,
+        "httpError": http_code.phrase,
+        "error": _service_name() + f".{error_code}",
+        "errorName": error_name,
+        "errorDescription": error_description,
+    }
+    return _encode(content, binary)
+
+
+def _deadline_of(content: typing.Any) -> typing.Optional[float]:
+    """Get the optional unix timestamp after which the caller stops waiting for the reply"""
+    if type(content) is not dict:
+        return None
+    deadline = content.get("deadline")
+    if type(deadline) not in (int, float):
+        return None
+    return deadline
+
+
 def executor(message: bytes) -> bytes:
     """Parse the message again and run the appropriate action"""
+    action = "unknown"
+    # Answer MessagePack encoded requests with MessagePack encoded replies
+    binary = wire.is_msgpack(message)
     try:
         _executor_logger.debug("Loading the message and parsing it")
-        request = models.requests.IncomingRequest.parse_obj({"payload": ujson.loads(message)})
-        _executor_logger.debug(
-            "Successfully loaded the message. Parsed message content:\n%s",
-            request.json(by_alias=False),
-        )
-        # Access the payload and check if the type of the payload
-        _executor_logger.debug("Checking the type of the request")
-        payload = request.payload
-        payload_type = type(payload)
-        _executor_logger.debug("Detected the following request type: %s", payload_type)
-        if payload_type == models.requests.TokenValidationData:
-            _executor_logger.info("Running a new token introspection request")
-            introspection_result = tools.run_token_introspection(request.payload)
-            return ujson.dumps(
-                introspection_result.dict(by_alias=True, exclude_none=True),
-                sort_keys=True,
-                ensure_ascii=False,
-            ).encode("utf-8")
-        elif payload_type == models.requests.ScopeCreationData:
-            # Create a new database entry
-            database.crud.store_new_scope(request.payload)
-            scope = database.crud.get_scope(request.payload.scope_string_value)
-            if scope is None:
-                raise exceptions.ServiceException(
-                    error_code="SCOPE_NOT_CREATED",
-                    error_name="Scope not created",
-                    error_description="The requested scope was not created",
-                    status_code=http.HTTPStatus.INTERNAL_SERVER_ERROR,
+        with metrics.STAGE_DURATION.time(stage="decode"):
+            content = _decode(message)
+        with _admission_controller().admit(_deadline_of(content)):
+            with metrics.STAGE_DURATION.time(stage="validate"):
+                request = models.requests.IncomingRequest.parse_obj({"payload": content})
+            if _executor_logger.isEnabledFor(logging.DEBUG):
+                _executor_logger.debug(
+                    "Successfully loaded the message. Parsed message content:\n%s",
+                    request.json(by_alias=False),
                 )
-            else:
-                return ujson.dumps(scope.dict()).encode("utf-8")
-        elif payload_type == models.requests.ScopeCheckData:
-            # Try to get a scope from the database
-            scope = database.crud.get_scope(request.payload.scope_identifier)
-            if scope is None:
-                raise exceptions.ServiceException(
-                    error_code="SCOPE_NOT_FOUND",
-                    error_name="Scope unavailable",
-                    error_description="The requested scope does not exist",
-                    status_code=http.HTTPStatus.NOT_FOUND,
+            # Access the payload and check if the type of the payload
+            _executor_logger.debug("Checking the type of the request")
+            payload = request.payload
+            payload_type = type(payload)
+            action = payload.action.value
+            _executor_logger.debug("Detected the following request type: %s", payload_type)
+            if payload_type == models.requests.TokenValidationData:
+                _executor_logger.info("Running a new token introspection request")
+                try:
+                    with metrics.STAGE_DURATION.time(stage="introspection"):
+                        introspection_result = tools.run_token_introspection(request.payload)
+                except Exception as error:
+                    if audit_log is not None:
+                        audit_log.record_error(request.payload.scopes, error)
+                    raise
+                metrics.REQUESTS.inc(
+                    action=action,
+                    reason="none"
+                    if introspection_result.reason is None
+                    else introspection_result.reason.value,
                 )
-            else:
-                return ujson.dumps(scope.dict()).encode("utf-8")
-        elif payload_type == models.requests.ScopeUpdateData:
-            # Try to get a scope from the database
-            if request.payload.scope_identifier in ["administrator", "me"]:
-                raise exceptions.ServiceException(
-                    error_code="SCOPE_NOT_MODIFIABLE",
-                    error_name="Scope not modifiable",
-                    error_description="The requested scope may not be changed since the scope is a core scope used by "
-                    "the authorization service",
-                    status_code=http.HTTPStatus.FORBIDDEN,
+                if audit_log is not None:
+                    audit_log.record(introspection_result, request.payload.scopes)
+                if binary:
+                    with metrics.STAGE_DURATION.time(stage="serialize"):
+                        return wire.encode_introspection(introspection_result)
+                return _encode(
+                    introspection_result.dict(by_alias=True, exclude_none=True),
+                    sort_keys=True,
+                    ensure_ascii=False,
                 )
-            scope = database.crud.get_scope(request.payload.scope_identifier)
-            if scope is None:
-                raise exceptions.ServiceException(
-                    error_code="SCOPE_NOT_FOUND",
-                    error_name="Scope unavailable",
-                    error_description="The requested scope does not exist",
-                    status_code=http.HTTPStatus.NOT_FOUND,
+            metrics.REQUESTS.inc(action=action, reason="none")
+            if payload_type == models.requests.ScopeCreationData:
+                # Create a new database entry
+                database.crud.store_new_scope(request.payload)
+                scope = database.crud.get_scope(
+                    request.payload.scope_string_value, use_primary=True
                 )
-            scope.name = scope.name if request.payload.name is None else payload.name
-            scope.description = (
-                scope.description if payload.description is None else payload.description
-            )
-            database.crud.store_changed_scope(scope)
-            scope = database.crud.get_scope(scope.id)
-            return ujson.dumps(scope.dict(by_alias=True)).encode("utf-8")
+                if scope is None:
+                    raise exceptions.ServiceException(
+                        error_code="SCOPE_NOT_CREATED",
+                        error_name="Scope not created",
+                        error_description="The requested scope was not created",
+                        status_code=http.HTTPStatus.INTERNAL_SERVER_ERROR,
+                    )
+                else:
+                    return _encode(scope.dict(), binary)
+            elif payload_type == models.requests.ScopeCheckData:
+                # Try to get a scope from the database
+                scope = database.crud.get_scope(request.payload.scope_identifier)
+                if scope is None:
+                    raise exceptions.ServiceException(
+                        error_code="SCOPE_NOT_FOUND",
+                        error_name="Scope unavailable",
+                        error_description="The requested scope does not exist",
+                        status_code=http.HTTPStatus.NOT_FOUND,
+                    )
+                else:
+                    return _encode(scope.dict(), binary)
+            elif payload_type == models.requests.ScopeUpdateData:
+                # Try to get a scope from the database
+                if request.payload.scope_identifier in ["administrator", "me"]:
+                    raise exceptions.ServiceException(
+                        error_code="SCOPE_NOT_MODIFIABLE",
+                        error_name="Scope not modifiable",
+                        error_description="The requested scope may not be changed since the scope is a core scope used by "
+                        "the authorization service",
+                        status_code=http.HTTPStatus.FORBIDDEN,
+                    )
+                # Read from the primary since the scope is written back
+                scope = database.crud.get_scope(request.payload.scope_identifier, use_primary=True)
+                if scope is None:
+                    raise exceptions.ServiceException(
+                        error_code="SCOPE_NOT_FOUND",
+                        error_name="Scope unavailable",
+                        error_description="The requested scope does not exist",
+                        status_code=http.HTTPStatus.NOT_FOUND,
+                    )
+                scope.name = scope.name if request.payload.name is None else payload.name
+                scope.description = (
+                    scope.description if payload.description is None else payload.description
+                )
+                database.crud.store_changed_scope(scope)
+                scope = database.crud.get_scope(scope.id, use_primary=True)
+                return _encode(scope.dict(by_alias=True), binary)
     except exceptions.ServiceException as exception:
-        content = {
-            "httpCode": exception.http_code.value,
-            "httpError": exception.http_code.phrase,
-            "error": settings.ServiceConfiguration().name + f".{exception.error_code}",
-            "errorName": exception.error_name,
-            "errorDescription": exception.error_description,
-        }
-        return ujson.dumps(content).encode("utf-8")
+        return _error_response(
+            binary,
+            action,
+            exception.http_code,
+            exception.error_code,
+            exception.error_name,
+            exception.error_description,
+        )
     except sqlalchemy.exc.IntegrityError as e:
-        content = {
-            "httpCode": http.HTTPStatus.CONFLICT.value,
-            "httpError": http.HTTPStatus.CONFLICT.phrase,
-            "error": settings.ServiceConfiguration().name + f".DUPLICATE_ENTRY",
-            "errorName": "Constraint Violation",
-            "errorDescription": "The resource you are trying to create already exists",
-        }
-        return ujson.dumps(content).encode("utf-8")
+        return _error_response(
+            binary,
+            action,
+            http.HTTPStatus.CONFLICT,
+            "DUPLICATE_ENTRY",
+            "Constraint Violation",
+            "The resource you are trying to create already exists",
+        )
     except Exception as e:
         print(e)
-        content = {
-            "httpCode": http.HTTPStatus.INTERNAL_SERVER_ERROR.value,
-            "httpError": http.HTTPStatus.INTERNAL_SERVER_ERROR.phrase,
-            "error": settings.ServiceConfiguration().name + f".INTERNAL_ERROR",
-            "errorName": "Internal Service Error",
-            "errorDescription": "The service encountered an internal error: " + str(e),
-        }
-        return ujson.dumps(content).encode("utf-8")
+        return _error_response(
+            binary,
+            action,
+            http.HTTPStatus.INTERNAL_SERVER_ERROR,
+            "INTERNAL_ERROR",
+            "Internal Service Error",
+            "The service encountered an internal error: " + str(e),
+        )
@@ -12,8 +12,18 @@ import amqp_rpc_server
 import pika.exchange_type
 import pydantic.error_wrappers
 
+import audit
+import database.crud
+import metrics
+import profiling
 import server_functions
 import settings
+import sharding
+import tasks.snapshots
+import tasks.sweeper
+import tasks.tokenindex
+import tasks.warmup
+import tokenindex
 import tools
 
 _stop_event = threading.Event()
@@ -21,6 +31,19 @@ _stop_event.clear()
 
 amqp_server: typing.Optional[amqp_rpc_server.Server] = None
 
+token_sweeper: typing.Optional[tasks.sweeper.ExpiredTokenSweeper] = None
+
+shard_manager: typing.Optional[sharding.ShardManager] = None
+
+snapshot_sync: typing.Optional[tasks.snapshots.AccountSnapshotSync] = None
+
+token_index_replicator: typing.Optional[tasks.tokenindex.TokenIndexReplicator] = None
+
+audit_log: typing.Optional[audit.AuditLog] = None
+
+QUEUE_NAME = "authorization-service"
+"""The name of the shared queue and the prefix of the shard queues"""
+
 
 def signal_handler(sign, frame):
     logging.info("Received shutdown signal. Stopping the AMQP server")
@@ -35,7 +58,12 @@ if __name__ == "__main__":
         level=_service_settings.log_level.upper(),
     )
     logging.info('Starting the "%s" service as PID: %s', _service_settings.name, os.getpid())
-    # = Read the AMQP Settings and check the server connection =
+    _metrics_settings = settings.MetricsConfiguration()
+    if _metrics_settings.enabled:
+        metrics.start_http_server(_metrics_settings.host, _metrics_settings.port)
+    _startup_timings: dict[str, float] = {}
+    _phase_start = time.perf_counter()
+    # = Read the AMQP and database settings =
     try:
         _amqp_settings = settings.AMQPConfiguration()
     except pydantic.error_wrappers.ValidationError as config_error:
@@ -44,25 +72,12 @@ if __name__ == "__main__":
             exc_info=config_error,
         )
         sys.exit(1)
-    # Now check the connection to the message broker
     logging.debug(
         "Successfully read the settings for the message broker connection:\n%s",
         _amqp_settings.json(indent=2, by_alias=True),
     )
     # Set the port if it is None
     _amqp_settings.dsn.port = 5672 if _amqp_settings.dsn.port is None else _amqp_settings.dsn.port
-    # Check the connectivity to the message broker
-    _message_broker_available = asyncio.run(
-        tools.is_host_available(host=_amqp_settings.dsn.host, port=_amqp_settings.dsn.port)
-    )
-    if not _message_broker_available:
-        logging.critical(
-            "The specified message broker (Host: %s | Port: %s) is not reachable",
-            _amqp_settings.dsn.host,
-            _amqp_settings.dsn.port,
-        )
-        sys.exit(1)
-    # = Read the database connection settings and check the database connectivity =
     try:
         _db_settings = settings.DatabaseConfiguration()
     except pydantic.error_wrappers.ValidationError as config_error:
@@ -76,40 +91,210 @@ if __name__ == "__main__":
     )
     # Set the port of the database if it is not set currently
     _db_settings.dsn.port = 3306 if _db_settings.dsn.port is None else _db_settings.dsn.port
-    # Check the connectivity to the database
-    _database_available = asyncio.run(
-        tools.is_host_available(_db_settings.dsn.host, _db_settings.dsn.port)
+    try:
+        _signed_token_settings = settings.SignedTokenConfiguration()
+    except pydantic.error_wrappers.ValidationError as config_error:
+        logging.critical(
+            "Unable to read the settings for the signed access tokens", exc_info=config_error
+        )
+        sys.exit(1)
+    _startup_timings["settings"] = time.perf_counter() - _phase_start
+    # = Check the connectivity to the message broker and the database concurrently =
+    _phase_start = time.perf_counter()
+    _message_broker_available, _database_available = asyncio.run(
+        tools.are_hosts_available(
+            (_amqp_settings.dsn.host, _amqp_settings.dsn.port),
+            (_db_settings.dsn.host, _db_settings.dsn.port),
+        )
     )
+    _startup_timings["preflight"] = time.perf_counter() - _phase_start
+    if not _message_broker_available:
+        logging.critical(
+            "The specified message broker (Host: %s | Port: %s) is not reachable",
+            _amqp_settings.dsn.host,
+            _amqp_settings.dsn.port,
+        )
     if not _database_available:
         logging.critical(
             "The specified database (Host: %s | Port: %s) is not reachable",
             _db_settings.dsn.host,
             _db_settings.dsn.port,
         )
+    if not (_message_broker_available and _database_available):
         sys.exit(1)
     logging.info("Passed all pre-startup checks and all dependent services are reachable")
+    # = Set up the opt-in profiling =
+    _profiling_settings = settings.ProfilingConfiguration()
+    _executor = server_functions.executor
+    _call_profiler: typing.Optional[profiling.CallProfiler] = None
+    if _profiling_settings.every_nth_call > 0 or _profiling_settings.signal_enabled:
+        os.makedirs(_profiling_settings.output_directory, exist_ok=True)
+    if _profiling_settings.every_nth_call > 0:
+        logging.info("Profiling every %s. executor call", _profiling_settings.every_nth_call)
+        _call_profiler = profiling.CallProfiler(
+            every_nth_call=_profiling_settings.every_nth_call,
+            output_directory=_profiling_settings.output_directory,
+        )
+        _executor = _call_profiler.wrap(_executor)
+    if _profiling_settings.signal_enabled:
+        _sampling_profiler = profiling.SamplingProfiler(
+            window=_profiling_settings.window,
+            sample_interval=_profiling_settings.sample_interval,
+            output_directory=_profiling_settings.output_directory,
+        )
+        signal.signal(signal.SIGUSR1, lambda sign, frame: _sampling_profiler.start())
     logging.info("Starting the AMQP Server")
+    _phase_start = time.perf_counter()
     amqp_server = amqp_rpc_server.Server(
         amqp_dsn=_amqp_settings.dsn,
         exchange_name=_amqp_settings.exchange,
         content_validator=server_functions.content_validator,
-        executor=server_functions.executor,
+        executor=_executor,
         exchange_type=pika.exchange_type.ExchangeType.direct,
-        queue_name="authorization-service",
+        queue_name=QUEUE_NAME,
         max_reconnection_attempts=5,
     )
     # Attach the signal handler
     signal.signal(signal.SIGTERM, signal_handler)
+    _startup_timings["server"] = time.perf_counter() - _phase_start
+    # Create the table tracking the live replicas before the shard manager uses it
+    _sharding_settings = settings.ShardingConfiguration()
+    if _sharding_settings.enabled:
+        try:
+            sharding.create_schema()
+        except RuntimeError as schema_error:
+            logging.critical(schema_error, exc_info=schema_error.__cause__)
+            sys.exit(1)
+    # Check that the account snapshots were created before they are used by the introspection
+    _snapshot_settings = settings.AccountSnapshotConfiguration()
+    if _snapshot_settings.enabled:
+        _phase_start = time.perf_counter()
+        try:
+            tasks.snapshots.check_schema()
+        except RuntimeError as schema_error:
+            logging.critical(schema_error, exc_info=schema_error.__cause__)
+            sys.exit(1)
+        snapshot_sync = tasks.snapshots.AccountSnapshotSync(
+            interval=_snapshot_settings.sync_interval,
+            window=_snapshot_settings.sync_window,
+            full_resync_interval=_snapshot_settings.full_resync_interval,
+        )
+        snapshot_sync.start()
+        tools.account_snapshots_enabled = True
+        _startup_timings["snapshots"] = time.perf_counter() - _phase_start
+    # Share the access tokens between the processes on this node
+    _token_index_settings = settings.TokenIndexConfiguration()
+    if _token_index_settings.enabled and not tokenindex.is_available():
+        logging.error("The token index is not supported on this platform and stays disabled")
+    elif _token_index_settings.enabled:
+        database.crud.token_index = tokenindex.TokenIndex(
+            _token_index_settings.path, _token_index_settings.capacity
+        )
+        token_index_replicator = tasks.tokenindex.TokenIndexReplicator(
+            database.crud.token_index,
+            poll_interval=_token_index_settings.poll_interval,
+            reconcile_interval=_token_index_settings.reconcile_interval,
+            batch_size=_token_index_settings.batch_size,
+            rescan_window=_token_index_settings.rescan_window,
+        )
+        token_index_replicator.start()
+    # Verify the signed access tokens without looking them up in the database
+    if _signed_token_settings.enabled:
+        tools.signed_token_settings = _signed_token_settings
+    # Preload the caches before consuming the first message
+    _warmup_settings = settings.WarmUpConfiguration()
+    if _warmup_settings.enabled:
+        logging.info("Warming up the caches")
+        _phase_start = time.perf_counter()
+        tasks.warmup.run(_warmup_settings.token_budget, _warmup_settings.timeout)
+        _startup_timings["warm-up"] = time.perf_counter() - _phase_start
+    # Record the token introspections in the audit log
+    _audit_settings = settings.AuditConfiguration()
+    if _audit_settings.enabled:
+        if _audit_settings.sink == "file":
+            _audit_sink = audit.FileSink(
+                path=_audit_settings.file_path,
+                max_bytes=_audit_settings.file_max_bytes,
+                backup_count=_audit_settings.file_backups,
+            )
+        else:
+            _audit_sink = audit.DatabaseSink()
+        audit_log = audit.AuditLog(
+            sink=_audit_sink,
+            buffer_size=_audit_settings.buffer_size,
+            batch_size=_audit_settings.batch_size,
+            flush_interval=_audit_settings.flush_interval,
+        )
+        audit_log.start()
+        server_functions.audit_log = audit_log
     # Start the server
+    _phase_start = time.perf_counter()
     amqp_server.start_server()
+    # Start the background removal of expired tokens
+    _sweeper_settings = settings.TokenSweeperConfiguration()
+    if _sweeper_settings.enabled:
+        token_sweeper = tasks.sweeper.ExpiredTokenSweeper(
+            interval=_sweeper_settings.interval,
+            batch_size=_sweeper_settings.batch_size,
+            batches_per_second=_sweeper_settings.batches_per_second,
+        )
+        token_sweeper.start()
+    # Consume the shard queues assigned to this replica
+    if _sharding_settings.enabled:
+
+        def _start_shard_consumer(shard: int) -> amqp_rpc_server.Server:
+            shard_server = amqp_rpc_server.Server(
+                amqp_dsn=_amqp_settings.dsn,
+                exchange_name=_amqp_settings.exchange,
+                content_validator=server_functions.content_validator,
+                executor=_executor,
+                exchange_type=pika.exchange_type.ExchangeType.direct,
+                queue_name=sharding.queue_name(QUEUE_NAME, shard),
+                max_reconnection_attempts=5,
+            )
+            shard_server.start_server()
+            return shard_server
+
+        shard_manager = sharding.ShardManager(
+            replica_id=_sharding_settings.replica_id,
+            shard_count=_sharding_settings.shard_count,
+            heartbeat_interval=_sharding_settings.heartbeat_interval,
+            replica_timeout=_sharding_settings.replica_timeout,
+            start_consumer=_start_shard_consumer,
+            stop_consumer=lambda shard_server: shard_server.stop_server(),
+        )
+        shard_manager.start()
+    _startup_timings["consumer"] = time.perf_counter() - _phase_start
+    logging.info(
+        "Startup finished in %.1f ms (%s)",
+        sum(_startup_timings.values()) * 1000,
+        ", ".join(
+            f"{phase}: {duration * 1000:.1f} ms" for phase, duration in _startup_timings.items()
+        ),
+    )
     while not _stop_event.is_set():
         try:
             amqp_server.raise_exceptions()
+            if shard_manager is not None:
+                for _shard_server in shard_manager.active_consumers():
+                    _shard_server.raise_exceptions()
             time.sleep(0.1)
         except KeyboardInterrupt:
             logging.info("Detected a KeyboardInterrupt. Stopping the AMQP server")
             _stop_event.set()
         except amqp_rpc_server.exceptions.MaxConnectionAttemptsReached:
             sys.exit(1)
+    if token_sweeper is not None:
+        token_sweeper.stop(timeout=10.0)
+    if shard_manager is not None:
+        shard_manager.stop(timeout=10.0)
+    if snapshot_sync is not None:
+        snapshot_sync.stop(timeout=10.0)
+    if token_index_replicator is not None:
+        token_index_replicator.stop(timeout=10.0)
     amqp_server.stop_server()
+    if audit_log is not None:
+        audit_log.stop(timeout=10.0)
+    if _call_profiler is not None:
+        _call_profiler.dump()
     logging.info("Stopped the AMQP Server. Exiting the service")
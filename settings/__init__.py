@@ -1,4 +1,6 @@
 """Module containing all settings which are used in the application"""
+import os
+import socket
 import typing
 
 import pydantic
@@ -91,8 +93,929 @@ class DatabaseConfiguration(BaseSettings):
     this service
     """
 
+    replica_dsn: typing.Optional[pydantic.PostgresDsn] = Field(
+        default=None,
+        title="PostgreSQL Read Replica Service Name",
+        description="A uri pointing to a read replica which answers the read-only queries",
+        env="CONFIG_DB_REPLICA_DSN",
+    )
+    """
+    PostgreSQL Read Replica Service Name
+
+    An URI pointing to a read replica of the database. If set, the read-only queries (e.g. the
+    token introspections) are executed on the replica while writes and reads of own writes are
+    executed on the primary database
+    """
+
+    replica_retry_interval: float = Field(
+        default=30.0,
+        title="Read Replica Retry Interval",
+        description="The number of seconds the primary is used after the replica failed",
+        env="CONFIG_DB_REPLICA_RETRY_INTERVAL",
+        gt=0,
+    )
+    """
+    Read Replica Retry Interval
+
+    The number of seconds for which the read-only queries are executed on the primary database
+    after the read replica was unreachable
+    """
+
+    connect_timeout: int = Field(
+        default=5,
+        title="Connect Timeout",
+        description="The number of seconds waited for a new database connection",
+        env="CONFIG_DB_CONNECT_TIMEOUT",
+        gt=0,
+    )
+    """
+    Connect Timeout
+
+    The number of seconds waited for a new connection to the database before the attempt fails
+    """
+
     class Config:
         """Configuration of the AMQP related settings"""
 
         env_file = ".env"
         """The file from which the settings may be read"""
+
+
+class TokenSweeperConfiguration(BaseSettings):
+    """Settings related to the background removal of expired tokens"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Expired Token Sweeper",
+        description="Enable the background task removing expired access and refresh tokens",
+        env="CONFIG_SWEEPER_ENABLED",
+    )
+    """
+    Expired Token Sweeper
+
+    Enable the background task which removes expired access and refresh tokens from the database.
+    The replicas do not coordinate their sweeps, so it should only be enabled on a single replica
+    """
+
+    interval: float = Field(
+        default=300.0,
+        title="Sweep Interval",
+        description="The number of seconds between two sweeps of the token tables",
+        env="CONFIG_SWEEPER_INTERVAL",
+        gt=0,
+    )
+    """
+    Sweep Interval
+
+    The number of seconds which are waited between two sweeps of the token tables
+    """
+
+    batch_size: int = Field(
+        default=500,
+        title="Sweep Batch Size",
+        description="The maximal number of tokens which are deleted in a single transaction",
+        env="CONFIG_SWEEPER_BATCH_SIZE",
+        gt=0,
+    )
+    """
+    Sweep Batch Size
+
+    The maximal number of tokens which are deleted in a single transaction
+    """
+
+    batches_per_second: float = Field(
+        default=2.0,
+        title="Sweep Rate",
+        description="The maximal number of delete batches which are executed per second",
+        env="CONFIG_SWEEPER_BATCHES_PER_SECOND",
+        gt=0,
+    )
+    """
+    Sweep Rate
+
+    The maximal number of delete batches which are executed per second. This keeps the sweeper
+    from competing with the token introspections for the database
+    """
+
+    class Config:
+        """Configuration of the sweeper related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class CacheConfiguration(BaseSettings):
+    """Settings related to the in-process caching of database query results"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Query Cache",
+        description="Cache the results of the database queries used by the token introspection",
+        env="CONFIG_CACHE_ENABLED",
+    )
+    """
+    Query Cache
+
+    Cache the results of the database queries used by the token introspection in the memory of
+    the service
+    """
+
+    ttl: float = Field(
+        default=30.0,
+        title="Cache Time To Live",
+        description="The number of seconds a cached token or account is used before it is reloaded",
+        env="CONFIG_CACHE_TTL",
+        ge=0,
+    )
+    """
+    Cache Time To Live
+
+    The number of seconds a cached token or user account is used before it is reloaded from the
+    database. Changes to tokens and accounts made by other services may be missed for this time
+    """
+
+    scope_ttl: float = Field(
+        default=300.0,
+        title="Scope Cache Time To Live",
+        description="The number of seconds a cached scope is used before it is reloaded",
+        env="CONFIG_CACHE_SCOPE_TTL",
+        ge=0,
+    )
+    """
+    Scope Cache Time To Live
+
+    The number of seconds a cached scope is used before it is reloaded from the database
+    """
+
+    max_tokens: int = Field(
+        default=100000,
+        title="Maximal Cached Tokens",
+        description="The maximal number of access tokens held in the cache",
+        env="CONFIG_CACHE_MAX_TOKENS",
+        ge=0,
+    )
+    """
+    Maximal Cached Tokens
+
+    The maximal number of access tokens held in the cache
+    """
+
+    max_accounts: int = Field(
+        default=10000,
+        title="Maximal Cached Accounts",
+        description="The maximal number of user accounts held in the cache",
+        env="CONFIG_CACHE_MAX_ACCOUNTS",
+        ge=0,
+    )
+    """
+    Maximal Cached Accounts
+
+    The maximal number of user accounts held in the cache
+    """
+
+    max_scopes: int = Field(
+        default=2000,
+        title="Maximal Cached Scopes",
+        description="The maximal number of scope entries held in the cache",
+        env="CONFIG_CACHE_MAX_SCOPES",
+        ge=0,
+    )
+    """
+    Maximal Cached Scopes
+
+    The maximal number of scope entries held in the cache. Every scope uses two entries
+    """
+
+    class Config:
+        """Configuration of the cache related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class WarmUpConfiguration(BaseSettings):
+    """Settings related to the warm-up of the caches before the service accepts messages"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Cache Warm-Up",
+        description="Preload the caches before the service starts consuming messages",
+        env="CONFIG_WARMUP_ENABLED",
+    )
+    """
+    Cache Warm-Up
+
+    Preload the scope catalog and the most recently created access tokens into the caches before
+    the service starts consuming messages. This requires the query cache to be enabled
+    """
+
+    token_budget: int = Field(
+        default=10000,
+        title="Warm-Up Token Budget",
+        description="The maximal number of access tokens loaded during the warm-up",
+        env="CONFIG_WARMUP_TOKEN_BUDGET",
+        ge=0,
+    )
+    """
+    Warm-Up Token Budget
+
+    The maximal number of still valid access tokens (together with their accounts and scopes)
+    which are loaded during the warm-up
+    """
+
+    timeout: float = Field(
+        default=30.0,
+        title="Warm-Up Timeout",
+        description="The number of seconds after which the service starts without a full warm-up",
+        env="CONFIG_WARMUP_TIMEOUT",
+        gt=0,
+    )
+    """
+    Warm-Up Timeout
+
+    The number of seconds after which the service starts consuming messages even if the warm-up
+    has not finished yet
+    """
+
+    class Config:
+        """Configuration of the warm-up related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class MetricsConfiguration(BaseSettings):
+    """Settings related to the metrics endpoint"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Metrics Endpoint",
+        description="Serve the request metrics in the Prometheus text format via HTTP",
+        env="CONFIG_METRICS_ENABLED",
+    )
+    """
+    Metrics Endpoint
+
+    Serve the request counters and latency histograms in the Prometheus text format on
+    ``/metrics``
+    """
+
+    host: str = Field(
+        default="0.0.0.0",
+        title="Metrics Endpoint Host",
+        description="The address to which the metrics endpoint is bound",
+        env="CONFIG_METRICS_HOST",
+    )
+    """
+    Metrics Endpoint Host
+
+    The address to which the metrics endpoint is bound
+    """
+
+    port: int = Field(
+        default=9102,
+        title="Metrics Endpoint Port",
+        description="The port to which the metrics endpoint is bound",
+        env="CONFIG_METRICS_PORT",
+    )
+    """
+    Metrics Endpoint Port
+
+    The port to which the metrics endpoint is bound
+    """
+
+    class Config:
+        """Configuration of the metrics related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class ProfilingConfiguration(BaseSettings):
+    """Settings related to the profiling of the running service"""
+
+    every_nth_call: int = Field(
+        default=0,
+        title="Profiled Call Interval",
+        description="Profile every n-th executor call. Profiling is disabled when set to zero",
+        env="CONFIG_PROFILING_EVERY_NTH_CALL",
+        ge=0,
+    )
+    """
+    Profiled Call Interval
+
+    Profile every n-th call of the message executor and aggregate the statistics into a file in
+    the output directory. Setting this to zero disables the call profiling
+    """
+
+    signal_enabled: bool = Field(
+        default=False,
+        title="Profiling Signal",
+        description="Run the sampling profiler for a fixed window when SIGUSR1 is received",
+        env="CONFIG_PROFILING_SIGNAL_ENABLED",
+    )
+    """
+    Profiling Signal
+
+    Run the sampling profiler for a fixed window when the service receives ``SIGUSR1``
+    """
+
+    window: float = Field(
+        default=30.0,
+        title="Sampling Window",
+        description="The number of seconds the sampling profiler runs after a signal",
+        env="CONFIG_PROFILING_WINDOW",
+        gt=0,
+    )
+    """
+    Sampling Window
+
+    The number of seconds the sampling profiler runs after ``SIGUSR1`` has been received
+    """
+
+    sample_interval: float = Field(
+        default=0.005,
+        title="Sampling Interval",
+        description="The number of seconds between two samples of the sampling profiler",
+        env="CONFIG_PROFILING_SAMPLE_INTERVAL",
+        gt=0,
+    )
+    """
+    Sampling Interval
+
+    The number of seconds between two samples of the sampling profiler
+    """
+
+    output_directory: str = Field(
+        default="/tmp/profiles",
+        title="Profiling Output Directory",
+        description="The directory into which the profiling results are written",
+        env="CONFIG_PROFILING_OUTPUT_DIRECTORY",
+    )
+    """
+    Profiling Output Directory
+
+    The directory into which the profiling results are written
+    """
+
+    class Config:
+        """Configuration of the profiling related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class AdmissionConfiguration(BaseSettings):
+    """Settings related to the admission control of incoming messages"""
+
+    max_in_flight: int = Field(
+        default=64,
+        title="Maximal Concurrent Executions",
+        description="The maximal number of concurrently executed messages (0 disables the limit)",
+        env="CONFIG_ADMISSION_MAX_IN_FLIGHT",
+        ge=0,
+    )
+    """
+    Maximal Concurrent Executions
+
+    The maximal number of messages which are executed concurrently. Setting this to zero disables
+    the limit
+    """
+
+    max_queue_time: float = Field(
+        default=1.0,
+        title="Maximal Queue Time",
+        description="The maximal number of seconds a message waits for an execution slot",
+        env="CONFIG_ADMISSION_MAX_QUEUE_TIME",
+        ge=0,
+    )
+    """
+    Maximal Queue Time
+
+    The maximal number of seconds a message waits for an execution slot before it is answered
+    with a ``503`` error. Messages carrying a ``deadline`` (unix timestamp) wait at most until the
+    deadline and are rejected without being executed if it already passed
+    """
+
+    class Config:
+        """Configuration of the admission related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class CircuitBreakerConfiguration(BaseSettings):
+    """Settings related to the handling of database outages"""
+
+    failure_threshold: int = Field(
+        default=5,
+        title="Circuit Breaker Failure Threshold",
+        description="The number of consecutive database failures opening the circuit breaker",
+        env="CONFIG_BREAKER_FAILURE_THRESHOLD",
+        ge=0,
+    )
+    """
+    Circuit Breaker Failure Threshold
+
+    The number of consecutive connection failures after which the database operations fail
+    immediately until the database is reachable again. Setting this to zero disables the circuit
+    breaker
+    """
+
+    probe_interval: float = Field(
+        default=2.0,
+        title="Recovery Probe Interval",
+        description="The number of seconds between two probes of an unavailable database",
+        env="CONFIG_BREAKER_PROBE_INTERVAL",
+        gt=0,
+    )
+    """
+    Recovery Probe Interval
+
+    The number of seconds between two probes checking if an unavailable database is reachable
+    again
+    """
+
+    stale_grace_period: float = Field(
+        default=300.0,
+        title="Stale Result Grace Period",
+        description="The number of seconds expired cache entries are served during an outage",
+        env="CONFIG_BREAKER_STALE_GRACE_PERIOD",
+        ge=0,
+    )
+    """
+    Stale Result Grace Period
+
+    The number of seconds after their time to live the cached query results are still used
+    while the database is unavailable. This requires the query cache to be enabled. Access tokens
+    deleted by this service, removed from the token index or cached as revoked are not served
+    """
+
+    class Config:
+        """Configuration of the circuit breaker related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class SignedTokenConfiguration(BaseSettings):
+    """Settings related to the offline verification of signed access tokens"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Signed Tokens",
+        description="Verify signed access tokens without looking them up in the database",
+        env="CONFIG_SIGNED_TOKENS_ENABLED",
+    )
+    """
+    Signed Tokens
+
+    Verify access tokens using the signed token format by their signature instead of looking them
+    up in the database. The database is consulted to check if the token has been revoked and to
+    load the owner account, whose active flag is not part of the token. Both results are cached,
+    so signed tokens require the query cache (``CONFIG_CACHE_ENABLED``) to be enabled
+    """
+
+    secret_key: typing.Optional[pydantic.SecretStr] = Field(
+        default=None,
+        title="Signing Key",
+        description="The secret key used for the HMAC-SHA256 signatures of the signed tokens",
+        env="CONFIG_SIGNED_TOKENS_SECRET_KEY",
+    )
+    """
+    Signing Key
+
+    The secret key used for the HMAC-SHA256 signatures of the signed tokens. It needs to be shared
+    with the service issuing the tokens
+    """
+
+    revocation_ttl: float = Field(
+        default=10.0,
+        title="Revocation Check Time To Live",
+        description="The number of seconds the result of a revocation check is reused",
+        env="CONFIG_SIGNED_TOKENS_REVOCATION_TTL",
+        ge=0,
+    )
+    """
+    Revocation Check Time To Live
+
+    The number of seconds the result of checking if a signed token or a token found in the token
+    index has been revoked is reused before the database is consulted again
+    """
+
+    max_revocation_entries: int = Field(
+        default=100000,
+        title="Maximal Cached Revocation Checks",
+        description="The maximal number of revocation check results held in memory",
+        env="CONFIG_SIGNED_TOKENS_MAX_REVOCATION_ENTRIES",
+        ge=0,
+    )
+    """
+    Maximal Cached Revocation Checks
+
+    The maximal number of revocation check results held in memory
+    """
+
+    @pydantic.root_validator(skip_on_failure=True)
+    def require_secret_key(cls, values):
+        if values["enabled"] and values["secret_key"] is None:
+            raise ValueError("Signed tokens require a secret key")
+        return values
+
+    @pydantic.root_validator(skip_on_failure=True)
+    def require_query_cache(cls, values):
+        if values["enabled"] and not CacheConfiguration().enabled:
+            raise ValueError("Signed tokens require the query cache (CONFIG_CACHE_ENABLED)")
+        return values
+
+    class Config:
+        """Configuration of the signed token related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class ShardingConfiguration(BaseSettings):
+    """Settings related to the sharded consumption of the messages"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Sharded Consumption",
+        description="Consume the shard queues assigned to this replica in addition to the queue",
+        env="CONFIG_SHARDING_ENABLED",
+    )
+    """
+    Sharded Consumption
+
+    Consume the shard queues assigned to this replica in addition to the shared queue. Callers
+    route their messages to a shard queue by a hash of the token to improve the cache hit rate
+    """
+
+    shard_count: int = Field(
+        default=16,
+        title="Shard Count",
+        description="The number of shard queues. Needs to be identical for callers and replicas",
+        env="CONFIG_SHARDING_SHARD_COUNT",
+        gt=0,
+    )
+    """
+    Shard Count
+
+    The number of shard queues. This needs to be identical for the callers and all replicas
+    """
+
+    replica_id: str = Field(
+        default_factory=lambda: f"{socket.gethostname()}-{os.getpid()}",
+        title="Replica Identifier",
+        description="The identifier of this replica in the replica membership",
+        env="CONFIG_SHARDING_REPLICA_ID",
+    )
+    """
+    Replica Identifier
+
+    The identifier of this replica in the replica membership. Defaults to the hostname and the
+    process id
+    """
+
+    heartbeat_interval: float = Field(
+        default=5.0,
+        title="Heartbeat Interval",
+        description="The number of seconds between two heartbeats of this replica",
+        env="CONFIG_SHARDING_HEARTBEAT_INTERVAL",
+        gt=0,
+    )
+    """
+    Heartbeat Interval
+
+    The number of seconds between two heartbeats of this replica. The shard assignment is
+    recalculated with every heartbeat
+    """
+
+    replica_timeout: float = Field(
+        default=15.0,
+        title="Replica Timeout",
+        description="The number of seconds after which a replica without heartbeat is removed",
+        env="CONFIG_SHARDING_REPLICA_TIMEOUT",
+        gt=0,
+    )
+    """
+    Replica Timeout
+
+    The number of seconds after which a replica without heartbeat is considered dead and its
+    shards are reassigned
+    """
+
+    class Config:
+        """Configuration of the sharding related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class AuditConfiguration(BaseSettings):
+    """Settings related to the audit log of the token introspections"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Audit Log Enabled",
+        description="Record the outcome of every token introspection in the audit log",
+        env="CONFIG_AUDIT_ENABLED",
+    )
+    """
+    Audit Log Enabled
+
+    Record the token, account, required scopes and decision of every token introspection in the
+    audit log
+    """
+
+    sink: typing.Literal["database", "file"] = Field(
+        default="database",
+        title="Audit Log Sink",
+        description="The sink the audit records are written to (database or file)",
+        env="CONFIG_AUDIT_SINK",
+    )
+    """
+    Audit Log Sink
+
+    The sink the audit records are written to. ``database`` writes into the
+    ``introspectionAudit`` table, ``file`` writes JSON lines into a rolling local file
+    """
+
+    buffer_size: int = Field(
+        default=10000,
+        title="Audit Buffer Size",
+        description="The maximal number of buffered audit records",
+        env="CONFIG_AUDIT_BUFFER_SIZE",
+        gt=0,
+    )
+    """
+    Audit Buffer Size
+
+    The maximal number of audit records waiting to be written. Records which do not fit into the
+    buffer are dropped and counted in the metrics instead of delaying the request processing
+    """
+
+    batch_size: int = Field(
+        default=500,
+        title="Audit Batch Size",
+        description="The maximal number of audit records written at once",
+        env="CONFIG_AUDIT_BATCH_SIZE",
+        gt=0,
+    )
+    """
+    Audit Batch Size
+
+    The maximal number of audit records written at once
+    """
+
+    flush_interval: float = Field(
+        default=1.0,
+        title="Audit Flush Interval",
+        description="The maximal number of seconds an audit record is buffered",
+        env="CONFIG_AUDIT_FLUSH_INTERVAL",
+        gt=0,
+    )
+    """
+    Audit Flush Interval
+
+    The maximal number of seconds an audit record is buffered before it is written
+    """
+
+    file_path: str = Field(
+        default="/tmp/authorization-audit.log",
+        title="Audit File Path",
+        description="The path of the audit log file if the file sink is used",
+        env="CONFIG_AUDIT_FILE_PATH",
+    )
+    """
+    Audit File Path
+
+    The path of the audit log file if the file sink is used
+    """
+
+    file_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        title="Audit File Size",
+        description="The size in bytes after which the audit log file is rotated",
+        env="CONFIG_AUDIT_FILE_MAX_BYTES",
+        gt=0,
+    )
+    """
+    Audit File Size
+
+    The size in bytes after which the audit log file is rotated
+    """
+
+    file_backups: int = Field(
+        default=5,
+        title="Audit File Backups",
+        description="The number of rotated audit log files which are kept",
+        env="CONFIG_AUDIT_FILE_BACKUPS",
+        ge=0,
+    )
+    """
+    Audit File Backups
+
+    The number of rotated audit log files which are kept
+    """
+
+    class Config:
+        """Configuration of the audit related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class AccountSnapshotConfiguration(BaseSettings):
+    """Settings related to the precomputed authorization snapshots of the accounts"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Account Snapshots",
+        description="Validate the token owner using the account snapshots",
+        env="CONFIG_SNAPSHOTS_ENABLED",
+    )
+    """
+    Account Snapshots
+
+    Validate the owner of a token with a single lookup of the account snapshot instead of loading
+    the account. The rules for the scopes of a token are not changed. The snapshot table and the
+    trigger maintaining it are created once by running ``python -m tasks.snapshots`` before the
+    snapshots are enabled
+    """
+
+    sync_interval: float = Field(
+        default=1.0,
+        title="Snapshot Synchronization Interval",
+        description="The number of seconds between two checks for changed account snapshots",
+        env="CONFIG_SNAPSHOTS_SYNC_INTERVAL",
+        gt=0,
+    )
+    """
+    Snapshot Synchronization Interval
+
+    The number of seconds between two checks for account snapshots with a newer version. Cached
+    snapshots and accounts are invalidated once their version changed
+    """
+
+    sync_window: int = Field(
+        default=1000,
+        title="Snapshot Synchronization Window",
+        description="The number of versions below the newest known one which are read again",
+        env="CONFIG_SNAPSHOTS_SYNC_WINDOW",
+        ge=0,
+    )
+    """
+    Snapshot Synchronization Window
+
+    The number of versions below the newest known version which are read again on every check.
+    Versions are issued when a transaction writes but become visible when it commits, so a lower
+    version may appear after a higher one has been read. The window needs to cover the versions
+    issued while such a transaction is open
+    """
+
+    full_resync_interval: float = Field(
+        default=300.0,
+        title="Full Snapshot Resynchronization Interval",
+        description="The number of seconds after which all cached snapshots are dropped",
+        env="CONFIG_SNAPSHOTS_FULL_RESYNC_INTERVAL",
+        gt=0,
+    )
+    """
+    Full Snapshot Resynchronization Interval
+
+    The number of seconds after which all cached snapshots and accounts are dropped, which bounds
+    the time a change missed by the synchronization window is not seen
+    """
+
+    cache_ttl: float = Field(
+        default=300.0,
+        title="Snapshot Cache Time To Live",
+        description="The number of seconds a cached account snapshot is used",
+        env="CONFIG_SNAPSHOTS_CACHE_TTL",
+        ge=0,
+    )
+    """
+    Snapshot Cache Time To Live
+
+    The number of seconds a cached account snapshot is used before it is reloaded. Since changed
+    snapshots are invalidated by their version, this may be much longer than the regular time to
+    live of the cache
+    """
+
+    class Config:
+        """Configuration of the account snapshot related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
+
+
+class TokenIndexConfiguration(BaseSettings):
+    """Settings related to the memory-mapped token index shared by the processes on a node"""
+
+    enabled: bool = Field(
+        default=False,
+        title="Token Index",
+        description="Look up the access tokens in a memory-mapped index before the database",
+        env="CONFIG_TOKEN_INDEX_ENABLED",
+    )
+    """
+    Token Index
+
+    Look up the access tokens and their scopes in a memory-mapped index which is shared by all
+    service processes on the node before querying the database
+    """
+
+    path: str = Field(
+        default="/dev/shm/authorization-token-index",
+        title="Token Index Path",
+        description="The path of the index file shared by the processes on the node",
+        env="CONFIG_TOKEN_INDEX_PATH",
+    )
+    """
+    Token Index Path
+
+    The path of the index file. All processes using the same path share the index. A path on a
+    memory-backed file system keeps the index from being written to a disk
+    """
+
+    capacity: int = Field(
+        default=262144,
+        title="Token Index Capacity",
+        description="The number of slots in the token index (rounded up to a power of two)",
+        env="CONFIG_TOKEN_INDEX_CAPACITY",
+        ge=1024,
+    )
+    """
+    Token Index Capacity
+
+    The number of slots in the token index, rounded up to a power of two. Every slot uses 96
+    bytes and at most 90% of the slots are filled. Changing the capacity of an existing index
+    file requires removing the file
+    """
+
+    poll_interval: float = Field(
+        default=1.0,
+        title="Token Index Poll Interval",
+        description="The number of seconds between two polls for new access tokens",
+        env="CONFIG_TOKEN_INDEX_POLL_INTERVAL",
+        gt=0,
+    )
+    """
+    Token Index Poll Interval
+
+    The number of seconds between two polls for new access tokens. New tokens are looked up in
+    the database until they were added to the index
+    """
+
+    reconcile_interval: float = Field(
+        default=30.0,
+        title="Token Index Reconciliation Interval",
+        description="The number of seconds between two checks for revoked indexed tokens",
+        env="CONFIG_TOKEN_INDEX_RECONCILE_INTERVAL",
+        gt=0,
+    )
+    """
+    Token Index Reconciliation Interval
+
+    The number of seconds between two checks of the indexed tokens against the database. Tokens
+    deleted by this service are removed from the index immediately, while tokens deleted or
+    deactivated by other services stay in the index for up to this time. They are not served
+    meanwhile, since every index hit is checked for a revocation whose result is cached for
+    CONFIG_SIGNED_TOKENS_REVOCATION_TTL seconds
+    """
+
+    rescan_window: int = Field(
+        default=10000,
+        title="Token Index Rescan Window",
+        description="The number of token ids below the newest tailed one which are read again",
+        env="CONFIG_TOKEN_INDEX_RESCAN_WINDOW",
+        ge=0,
+    )
+    """
+    Token Index Rescan Window
+
+    The number of token ids below the newest tailed id which are read again on every
+    reconciliation. Ids are issued on insert but become visible on commit, so a token may appear
+    after a higher id has been tailed. Such tokens are looked up in the database until they are
+    added by the rescan
+    """
+
+    batch_size: int = Field(
+        default=1000,
+        title="Token Index Batch Size",
+        description="The number of access tokens read or checked in a single query",
+        env="CONFIG_TOKEN_INDEX_BATCH_SIZE",
+        gt=0,
+    )
+    """
+    Token Index Batch Size
+
+    The number of access tokens read or checked in a single query
+    """
+
+    class Config:
+        """Configuration of the token index related settings"""
+
+        env_file = ".env"
+        """The file from which the settings may be read"""
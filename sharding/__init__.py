@@ -0,0 +1,205 @@
+"""
+Sharded consumption of the token introspections for a better cache locality
+
+In the sharded mode the messages are distributed over a fixed number of shard queues. Callers pick
+the shard by a hash of the token (see :func:`shard_of` and :func:`queue_name`) and publish the
+message using the name of the shard queue as routing key. Every replica consumes the shard queues
+assigned to it by rendezvous hashing over the live replicas, which are tracked by heartbeats in
+the database. When a replica joins or leaves, only the shards gained or lost by it move to another
+replica, so the cached introspections of a token stay on a single replica most of the time
+"""
+import hashlib
+import logging
+import threading
+import time
+import typing
+
+import sqlalchemy.exc
+
+import database
+import database.crud
+import database.tables
+
+_logger = logging.getLogger(__name__)
+
+
+def shard_of(token: str, shard_count: int) -> int:
+    """
+    Get the shard responsible for the token
+
+    :param token: The token which shall be introspected
+    :type token: str
+    :param shard_count: The number of shards
+    :type shard_count: int
+    :return: The number of the shard
+    :rtype: int
+    """
+    digest = hashlib.sha3_224(token.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def queue_name(base_name: str, shard: int) -> str:
+    """Get the name of the queue (and routing key) of the shard"""
+    return f"{base_name}.shard-{shard}"
+
+
+def _score(replica_id: str, shard: int) -> int:
+    digest = hashlib.sha256(f"{replica_id}/{shard}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def assign_shards(shard_count: int, replica_ids: typing.Iterable[str]) -> dict[str, set[int]]:
+    """
+    Assign every shard to the replica with the highest rendezvous hash score
+
+    :param shard_count: The number of shards
+    :type shard_count: int
+    :param replica_ids: The identifiers of the live replicas
+    :type replica_ids: typing.Iterable[str]
+    :return: The shards owned by every replica
+    :rtype: dict[str, set[int]]
+    """
+    replica_ids = sorted(set(replica_ids))
+    assignment: dict[str, set[int]] = {replica_id: set() for replica_id in replica_ids}
+    if len(replica_ids) == 0:
+        return assignment
+    for shard in range(shard_count):
+        owner = max(replica_ids, key=lambda replica_id: _score(replica_id, shard))
+        assignment[owner].add(shard)
+    return assignment
+
+
+def create_schema() -> None:
+    """
+    Create the table tracking the live replicas if it does not exist yet
+
+    :raises RuntimeError: The table could not be created
+    """
+    try:
+        database.tables.service_replicas.create(bind=database.engine, checkfirst=True)
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        # Another replica may have created the table at the same time
+        if sqlalchemy.inspect(database.engine).has_table(
+            database.tables.service_replicas.name, schema=database.tables.service_replicas.schema
+        ):
+            return
+        raise RuntimeError(
+            "Unable to create the replica table. Create it with a user allowed to change the "
+            "schema or disable the sharding"
+        ) from e
+
+
+class ShardManager(threading.Thread):
+    """
+    A background thread which keeps the heartbeat of this replica up to date and consumes the
+    shard queues assigned to it.
+
+    Newly assigned shards are consumed immediately while shards which were assigned to another
+    replica are released one heartbeat interval later, which gives the new owner time to start
+    consuming
+    """
+
+    def __init__(
+        self,
+        replica_id: str,
+        shard_count: int,
+        heartbeat_interval: float,
+        replica_timeout: float,
+        start_consumer: typing.Callable[[int], typing.Any],
+        stop_consumer: typing.Callable[[typing.Any], None],
+    ):
+        """
+        Create a new shard manager
+
+        :param replica_id: The identifier of this replica
+        :type replica_id: str
+        :param shard_count: The number of shards
+        :type shard_count: int
+        :param heartbeat_interval: The number of seconds between two heartbeats
+        :type heartbeat_interval: float
+        :param replica_timeout: The number of seconds after which a replica without heartbeat is
+            considered dead
+        :type replica_timeout: float
+        :param start_consumer: Starts consuming the queue of a shard and returns the consumer
+        :type start_consumer: typing.Callable[[int], typing.Any]
+        :param stop_consumer: Stops a consumer returned by ``start_consumer``
+        :type stop_consumer: typing.Callable[[typing.Any], None]
+        """
+        super().__init__(name="shard-manager", daemon=True)
+        self.replica_id = replica_id
+        self.shard_count = shard_count
+        self.heartbeat_interval = heartbeat_interval
+        self.replica_timeout = replica_timeout
+        self.start_consumer = start_consumer
+        self.stop_consumer = stop_consumer
+        self._consumers: dict[int, typing.Any] = {}
+        self._consumers_lock = threading.Lock()
+        self._pending_releases: dict[int, float] = {}
+        self._stop_event = threading.Event()
+
+    def active_consumers(self) -> list[typing.Any]:
+        """
+        Get the consumers of the shards currently owned by this replica
+
+        :return: A snapshot of the consumers which is not changed by later rebalances
+        :rtype: list[typing.Any]
+        """
+        with self._consumers_lock:
+            return list(self._consumers.values())
+
+    def run(self) -> None:
+        _logger.info(
+            "Started the shard manager for replica %s (%s shards)",
+            self.replica_id,
+            self.shard_count,
+        )
+        while not self._stop_event.is_set():
+            try:
+                database.crud.store_replica_heartbeat(self.replica_id)
+                live_replicas = set(database.crud.get_live_replicas(self.replica_timeout))
+                live_replicas.add(self.replica_id)
+                self.rebalance(assign_shards(self.shard_count, live_replicas)[self.replica_id])
+            except Exception as e:
+                _logger.error("Unable to update the shard assignment", exc_info=e)
+            self._stop_event.wait(self.heartbeat_interval)
+
+    def rebalance(self, owned_shards: set[int]) -> None:
+        """
+        Start consuming the newly owned shards and release the shards owned by other replicas
+
+        :param owned_shards: The shards currently assigned to this replica
+        :type owned_shards: set[int]
+        """
+        with self._consumers_lock:
+            consumed_shards = set(self._consumers.keys())
+        for shard in sorted(owned_shards - consumed_shards):
+            consumer = self.start_consumer(shard)
+            with self._consumers_lock:
+                self._consumers[shard] = consumer
+            _logger.info("Started consuming shard %s", shard)
+        for shard in owned_shards:
+            self._pending_releases.pop(shard, None)
+        now = time.monotonic()
+        for shard in sorted(consumed_shards - owned_shards):
+            release_at = self._pending_releases.setdefault(shard, now + self.heartbeat_interval)
+            if now >= release_at:
+                with self._consumers_lock:
+                    consumer = self._consumers.pop(shard)
+                self.stop_consumer(consumer)
+                del self._pending_releases[shard]
+                _logger.info("Released shard %s to another replica", shard)
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stop consuming all shards and leave the membership"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        with self._consumers_lock:
+            consumers = list(self._consumers.values())
+            self._consumers.clear()
+        for consumer in consumers:
+            self.stop_consumer(consumer)
+        try:
+            database.crud.delete_replica(self.replica_id)
+        except Exception as e:
+            _logger.warning("Unable to leave the replica membership", exc_info=e)
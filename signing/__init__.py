@@ -0,0 +1,127 @@
+"""
+Self-contained access tokens which carry their claims and are verified without a database lookup
+
+A signed token has the format ``wst1.<payload>.<signature>``. The payload is the url-safe base64
+encoding of the token id, the expiry and creation time, the owner id and the scope values. The
+signature is the url-safe base64 encoding of the HMAC-SHA256 of everything before the last dot
+"""
+import base64
+import binascii
+import dataclasses
+import datetime
+import hashlib
+import hmac
+import struct
+import typing
+
+PREFIX = "wst1"
+"""The prefix identifying signed tokens and the version of their format"""
+
+_CLAIMS = struct.Struct("!QqqQ")
+"""The binary layout of the token id, expiry, creation time and owner id"""
+
+
+@dataclasses.dataclass(frozen=True)
+class SignedToken:
+    """The claims carried by a signed token"""
+
+    token_id: int
+    """The id of the token in the ``accessTokens`` table which is used for revocations"""
+
+    expires: datetime.datetime
+    """The time and date of expiration"""
+
+    created: datetime.datetime
+    """The time and date on which the token has been created"""
+
+    owner_id: int
+    """The id of the account this token is associated to"""
+
+    scopes: tuple[str, ...]
+    """The string values of the scopes associated to the token"""
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(message: str, key: bytes) -> bytes:
+    return hmac.new(key, message.encode("ascii"), hashlib.sha256).digest()
+
+
+def is_signed_token(token: str) -> bool:
+    """Check if the token uses the signed token format"""
+    return token.startswith(PREFIX + ".")
+
+
+def issue(
+    token_id: int,
+    expires: datetime.datetime,
+    created: datetime.datetime,
+    owner_id: int,
+    scopes: typing.Iterable[str],
+    key: bytes,
+) -> str:
+    """
+    Create a new signed token
+
+    :param token_id: The id of the token in the ``accessTokens`` table
+    :type token_id: int
+    :param expires: The time and date of expiration
+    :type expires: datetime.datetime
+    :param created: The time and date on which the token has been created
+    :type created: datetime.datetime
+    :param owner_id: The id of the account the token is associated to
+    :type owner_id: int
+    :param scopes: The string values of the scopes associated to the token
+    :type scopes: typing.Iterable[str]
+    :param key: The secret key used for the signature
+    :type key: bytes
+    :return: The signed token
+    :rtype: str
+    """
+    payload = _CLAIMS.pack(
+        token_id, int(expires.timestamp()), int(created.timestamp()), owner_id
+    ) + " ".join(scopes).encode("utf-8")
+    message = f"{PREFIX}.{_encode(payload)}"
+    return f"{message}.{_encode(_sign(message, key))}"
+
+
+def verify(token: str, key: bytes) -> typing.Optional[SignedToken]:
+    """
+    Verify the signature of a signed token and read its claims
+
+    :param token: The signed token
+    :type token: str
+    :param key: The secret key used for the signature
+    :type key: bytes
+    :return: The claims of the token or ``None`` if the token is malformed or the signature is
+        invalid
+    :rtype: typing.Optional[SignedToken]
+    """
+    message, _, signature = token.rpartition(".")
+    if not is_signed_token(message) or message.count(".") != 1:
+        return None
+    try:
+        # The encoded signatures are compared since the decoding ignores the unused bits of the
+        # last character, which would let several encodings of the same signature pass
+        if not hmac.compare_digest(
+            signature.encode("ascii"), _encode(_sign(message, key)).encode("ascii")
+        ):
+            return None
+        payload = _decode(message[len(PREFIX) + 1 :])
+        token_id, expires, created, owner_id = _CLAIMS.unpack_from(payload)
+        scopes = payload[_CLAIMS.size :].decode("utf-8").split()
+    except (binascii.Error, struct.error, UnicodeError, ValueError):
+        return None
+    return SignedToken(
+        token_id=token_id,
+        expires=datetime.datetime.fromtimestamp(expires, tz=datetime.timezone.utc),
+        created=datetime.datetime.fromtimestamp(created, tz=datetime.timezone.utc),
+        owner_id=owner_id,
+        scopes=tuple(scopes),
+    )
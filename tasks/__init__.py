@@ -0,0 +1 @@
+"""Background and lifecycle tasks which are run next to the AMQP server"""
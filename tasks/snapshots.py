@@ -0,0 +1,209 @@
+"""Background synchronization of the cached account snapshots"""
+import logging
+import threading
+import time
+import typing
+
+import sqlalchemy
+import sqlalchemy.exc
+
+import database
+import database.cache
+import database.crud
+import database.tables
+
+_logger = logging.getLogger(__name__)
+
+_BACKFILL_BATCH_SIZE = 500
+"""The number of accounts whose snapshots are created in a single transaction"""
+
+
+_MIGRATION_LOCK_ID = 7_301_004_212
+"""The key of the PostgreSQL advisory lock serializing concurrent migrations"""
+
+
+def check_schema() -> None:
+    """
+    Check that the account snapshot table and (on PostgreSQL) the trigger maintaining it exist.
+
+    The objects are created by the migration of this module, which is run once before the account
+    snapshots are enabled (``python -m tasks.snapshots``)
+
+    :raises RuntimeError: The objects are missing or outdated
+    """
+    table = database.tables.account_snapshots
+    try:
+        with database.engine.connect() as connection:
+            if not sqlalchemy.inspect(connection).has_table(table.name, schema=table.schema):
+                raise RuntimeError(
+                    "The account snapshot table does not exist. Create it by running "
+                    "'python -m tasks.snapshots' or disable the account snapshots"
+                )
+            if connection.dialect.name != "postgresql":
+                _logger.warning(
+                    "The account snapshots are only updated automatically on PostgreSQL. On %s "
+                    "they need to be refreshed with database.crud.refresh_account_snapshots",
+                    connection.dialect.name,
+                )
+                return
+            trigger_query = sqlalchemy.text(
+                """
+                SELECT relation.relname
+                FROM pg_trigger AS trigger
+                JOIN pg_class AS relation ON relation.oid = trigger.tgrelid
+                JOIN pg_namespace AS namespace ON namespace.oid = relation.relnamespace
+                WHERE trigger.tgname = 'account_snapshot' AND namespace.nspname = :schema
+                """
+            )
+            triggered_tables = set(
+                connection.execute(trigger_query, {"schema": table.schema}).scalars()
+            )
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        raise RuntimeError("Unable to check the account snapshot table and trigger") from e
+    if triggered_tables != {database.tables.accounts.name}:
+        raise RuntimeError(
+            "The trigger maintaining the account snapshots is missing or outdated. Update it by "
+            "running 'python -m tasks.snapshots' or disable the account snapshots"
+        )
+
+
+def migrate() -> int:
+    """
+    Create the account snapshot table, its version sequence and (on PostgreSQL) the trigger
+    maintaining it and create the snapshots of all existing accounts.
+
+    The trigger statements take exclusive locks on the account tables, so the migration is run
+    once by an operator instead of at the startup of every replica. Concurrent migrations are
+    serialized by an advisory lock
+
+    :return: The number of created snapshots
+    :rtype: int
+    :raises RuntimeError: The objects could not be created
+    """
+    try:
+        with database.engine.connect() as lock_connection:
+            is_postgresql = lock_connection.dialect.name == "postgresql"
+            if is_postgresql:
+                lock_connection.execute(
+                    sqlalchemy.select([sqlalchemy.func.pg_advisory_lock(_MIGRATION_LOCK_ID)])
+                )
+            try:
+                with database.engine.begin() as connection:
+                    database.tables.account_snapshot_versions.create(
+                        bind=connection, checkfirst=True
+                    )
+                    database.tables.account_snapshots.create(bind=connection, checkfirst=True)
+                    if is_postgresql:
+                        connection.execute(database.tables.account_snapshot_triggers)
+                return backfill()
+            finally:
+                if is_postgresql:
+                    lock_connection.execute(
+                        sqlalchemy.select([sqlalchemy.func.pg_advisory_unlock(_MIGRATION_LOCK_ID)])
+                    )
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        raise RuntimeError(
+            "Unable to create the account snapshot table and trigger. Run the migration with a "
+            "user allowed to change the schema"
+        ) from e
+
+
+def backfill(batch_size: int = _BACKFILL_BATCH_SIZE) -> int:
+    """
+    Create the snapshots of all accounts which do not have one yet
+
+    :param batch_size: The number of accounts whose snapshots are created at once
+    :type batch_size: int
+    :return: The number of created snapshots
+    :rtype: int
+    """
+    created_snapshots = 0
+    while True:
+        account_ids = database.crud.get_accounts_without_snapshot(batch_size)
+        if len(account_ids) == 0:
+            break
+        database.crud.refresh_account_snapshots(account_ids)
+        created_snapshots += len(account_ids)
+    return created_snapshots
+
+
+class AccountSnapshotSync(threading.Thread):
+    """
+    A background thread which periodically looks for account snapshots with a newer version and
+    removes the cached snapshots and accounts which changed.
+
+    The versions are issued when a transaction writes a snapshot but become visible when it
+    commits, so a lower version may become visible after a higher one has been read. Therefore a
+    window of versions below the newest known one is read again on every check and the versions
+    seen in it are remembered. All cached snapshots and accounts are dropped periodically to bound
+    the effect of changes which appear even later
+    """
+
+    def __init__(self, interval: float, window: int, full_resync_interval: float):
+        """
+        Create a new synchronization
+
+        :param interval: The number of seconds between two checks for changed snapshots
+        :type interval: float
+        :param window: The number of versions below the newest known one which are read again
+        :type window: int
+        :param full_resync_interval: The number of seconds after which all cached snapshots and
+            accounts are dropped
+        :type full_resync_interval: float
+        """
+        super().__init__(name="account-snapshot-sync", daemon=True)
+        self.interval = interval
+        self.window = window
+        self.full_resync_interval = full_resync_interval
+        self.known_version = database.crud.get_latest_account_snapshot_version()
+        self._seen_changes: set[tuple[int, int]] = set()
+        self._last_full_resync = time.monotonic()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        _logger.info(
+            "Started the account snapshot synchronization at version %s", self.known_version
+        )
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.synchronize()
+            except Exception as e:
+                _logger.error("The synchronization of the account snapshots failed", exc_info=e)
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stop the synchronization"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def synchronize(self) -> None:
+        """Invalidate the cache entries of all accounts whose snapshot changed since the last run"""
+        if time.monotonic() - self._last_full_resync >= self.full_resync_interval:
+            database.cache.account_snapshots.clear()
+            database.cache.accounts.clear()
+            self._last_full_resync = time.monotonic()
+        window_start = max(0, self.known_version - self.window)
+        invalidated_snapshots = 0
+        for snapshot in database.crud.get_changed_account_snapshots(window_start):
+            change = (snapshot.account_id, snapshot.version)
+            if change in self._seen_changes:
+                continue
+            self._seen_changes.add(change)
+            database.cache.account_snapshots.pop(snapshot.account_id)
+            database.cache.accounts.pop(snapshot.account_id)
+            self.known_version = max(self.known_version, snapshot.version)
+            invalidated_snapshots += 1
+        # Forget the changes which left the window
+        window_start = max(0, self.known_version - self.window)
+        self._seen_changes = {change for change in self._seen_changes if change[1] > window_start}
+        if invalidated_snapshots > 0:
+            _logger.debug(
+                "Invalidated %s changed account snapshots (version: %s)",
+                invalidated_snapshots,
+                self.known_version,
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.info("Created %s missing account snapshots", migrate())
@@ -0,0 +1,98 @@
+"""Background task removing expired tokens from the database"""
+import logging
+import threading
+import time
+import typing
+
+import database.crud
+
+_logger = logging.getLogger(__name__)
+
+
+class ExpiredTokenSweeper(threading.Thread):
+    """
+    A background thread which periodically deletes expired access and refresh tokens.
+
+    The tokens are deleted in batches of a bounded size and the number of batches per second is
+    limited to keep the sweeper from competing with the token introspections for the database
+    """
+
+    def __init__(self, interval: float, batch_size: int, batches_per_second: float):
+        """
+        Create a new sweeper
+
+        :param interval: The number of seconds between two sweeps
+        :type interval: float
+        :param batch_size: The maximal number of tokens deleted in a single batch
+        :type batch_size: int
+        :param batches_per_second: The maximal number of batches executed per second
+        :type batches_per_second: float
+        """
+        super().__init__(name="expired-token-sweeper", daemon=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_spacing = 1.0 / batches_per_second
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        _logger.info(
+            "Started the expired token sweeper (interval: %ss, batch size: %s)",
+            self.interval,
+            self.batch_size,
+        )
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                _logger.error("The sweep of the expired tokens failed", exc_info=e)
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stop the sweeper and wait for the current batch to finish"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def sweep(self) -> None:
+        """Run a single sweep over the access and refresh tokens"""
+        self._sweep_table("access tokens", database.crud.delete_expired_access_tokens)
+        self._sweep_table("refresh tokens", database.crud.delete_expired_refresh_tokens)
+
+    def _sweep_table(
+        self, token_kind: str, delete_batch: typing.Callable[[int], tuple[int, int]]
+    ) -> None:
+        """
+        Delete batches of expired tokens until no expired token is left or the sweeper is stopped
+
+        :param token_kind: The kind of the token used in the log messages
+        :type token_kind: str
+        :param delete_batch: The crud function which deletes a single batch
+        :type delete_batch: typing.Callable[[int], tuple[int, int]]
+        """
+        total_tokens = 0
+        total_scopes = 0
+        while not self._stop_event.is_set():
+            batch_start = time.perf_counter()
+            deleted_tokens, deleted_scopes = delete_batch(self.batch_size)
+            batch_duration = time.perf_counter() - batch_start
+            if deleted_tokens == 0:
+                break
+            total_tokens += deleted_tokens
+            total_scopes += deleted_scopes
+            _logger.info(
+                "Deleted %s expired %s and %s scope associations in %.1f ms",
+                deleted_tokens,
+                token_kind,
+                deleted_scopes,
+                batch_duration * 1000,
+            )
+            if deleted_tokens < self.batch_size:
+                break
+            # Throttle the batches to the configured rate
+            self._stop_event.wait(max(0.0, self.batch_spacing - batch_duration))
+        if total_tokens > 0:
+            _logger.info(
+                "Sweep removed %s expired %s and %s scope associations",
+                total_tokens,
+                token_kind,
+                total_scopes,
+            )
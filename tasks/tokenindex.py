@@ -0,0 +1,193 @@
+"""Background replication of the access tokens into the memory-mapped token index"""
+import datetime
+import logging
+import threading
+import time
+import typing
+
+import database.cache
+import database.crud
+import models.common
+import tokenindex
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_logger = logging.getLogger(__name__)
+
+
+class TokenIndexReplicator(threading.Thread):
+    """
+    A background thread which keeps the token index in sync with the ``accessTokens`` table.
+
+    Every process on the node runs a replicator, but only the one holding the leader lock writes
+    to the index. When that process exits, the lock is released by the operating system and the
+    replicator of another process takes over. The leader tails the tokens created since the last
+    poll by their id and periodically reconciles the indexed tokens with the database to remove
+    the tokens which were deleted, deactivated or expired.
+
+    Ids are issued when a token is inserted but become visible when the transaction commits, so a
+    token may appear after a higher id has been tailed. The reconciliation therefore reads the
+    tokens in a window of ids below the high water mark again and adds the ones which are missing
+    """
+
+    def __init__(
+        self,
+        index: tokenindex.TokenIndex,
+        poll_interval: float,
+        reconcile_interval: float,
+        batch_size: int,
+        rescan_window: int,
+    ):
+        """
+        Create a new replicator
+
+        :param index: The token index which is kept in sync
+        :type index: tokenindex.TokenIndex
+        :param poll_interval: The number of seconds between two polls for new tokens
+        :type poll_interval: float
+        :param reconcile_interval: The number of seconds between two reconciliations
+        :type reconcile_interval: float
+        :param batch_size: The number of tokens read or checked in a single query
+        :type batch_size: int
+        :param rescan_window: The number of ids below the high water mark which are read again
+            on every reconciliation
+        :type rescan_window: int
+        """
+        super().__init__(name="token-index-replicator", daemon=True)
+        self.index = index
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.batch_size = batch_size
+        self.rescan_window = rescan_window
+        self.is_leader = False
+        self._leader_lock_file = open(f"{index.path}.leader", "a+b")
+        self._last_reconciliation = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                if self.is_leader or self._try_become_leader():
+                    self.tail()
+                    if time.monotonic() - self._last_reconciliation >= self.reconcile_interval:
+                        self.rescan()
+                        self.reconcile()
+                        self.index.compact()
+            except Exception as e:
+                _logger.error("The replication of the token index failed", exc_info=e)
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stop the replicator and release the leader lock"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        # Closing the file releases the leader lock, which the running thread still relies on
+        if not self.is_alive():
+            self._leader_lock_file.close()
+
+    def _try_become_leader(self) -> bool:
+        try:
+            fcntl.flock(self._leader_lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        _logger.info(
+            "Replicating the access tokens into the token index (%s tokens, high water mark: %s)",
+            len(self.index),
+            self.index.high_water_mark,
+        )
+        self.is_leader = True
+        return True
+
+    def tail(self) -> None:
+        """Add the access tokens created since the last poll to the index"""
+        while not self._stop_event.is_set():
+            tokens = database.crud.get_access_tokens_after(
+                self.index.high_water_mark, self.batch_size
+            )
+            if len(tokens) == 0:
+                return
+            self._store_tokens(tokens, high_water_mark=tokens[-1].id)
+            if len(tokens) < self.batch_size:
+                return
+
+    def rescan(self) -> None:
+        """Add the tokens below the high water mark which became visible after it was advanced"""
+        high_water_mark = self.index.high_water_mark
+        last_token_id = max(0, high_water_mark - self.rescan_window)
+        while not self._stop_event.is_set() and last_token_id < high_water_mark:
+            tokens = [
+                token
+                for token in database.crud.get_access_tokens_after(last_token_id, self.batch_size)
+                if token.id <= high_water_mark
+            ]
+            if len(tokens) == 0:
+                return
+            # Tokens which are already indexed are updated in place
+            self._store_tokens(tokens, high_water_mark=high_water_mark)
+            last_token_id = tokens[-1].id
+
+    def _store_tokens(
+        self, tokens: list[models.common.TokenInformation], high_water_mark: int
+    ) -> None:
+        """Store the active and unexpired tokens in the index"""
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        valid_tokens = [
+            token
+            for token in tokens
+            if token.active and token.expires > now and token.created is not None
+        ]
+        scope_ids = database.crud.get_access_token_scope_ids([token.id for token in valid_tokens])
+        rejected_tokens = self.index.store(
+            (
+                tokenindex.IndexedToken(
+                    digest=bytes.fromhex(token.value.get_secret_value()),
+                    token_id=token.id,
+                    expires=token.expires,
+                    created=token.created,
+                    owner_id=token.owner_id,
+                    scope_ids=scope_ids[token.id],
+                )
+                for token in valid_tokens
+            ),
+            high_water_mark=high_water_mark,
+        )
+        if rejected_tokens > 0:
+            _logger.warning(
+                "The token index is full and rejected %s access tokens", rejected_tokens
+            )
+
+    def reconcile(self) -> None:
+        """Remove the indexed tokens which were deleted, deactivated or expired"""
+        reconciliation_start = time.perf_counter()
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        removed_digests: list[bytes] = []
+        batch: dict[int, bytes] = {}
+        for digest, token_id, expires in self.index.live_records():
+            if expires <= now:
+                removed_digests.append(digest)
+                continue
+            batch[token_id] = digest
+            if len(batch) >= self.batch_size:
+                removed_digests.extend(self._revoked_digests(batch))
+                batch = {}
+        if len(batch) > 0:
+            removed_digests.extend(self._revoked_digests(batch))
+        self.index.remove(removed_digests)
+        # Keep the cached entries of the removed tokens from being served during an outage
+        for digest in removed_digests:
+            database.cache.access_tokens.pop(digest.hex())
+        self._last_reconciliation = time.monotonic()
+        _logger.debug(
+            "Removed %s revoked or expired access tokens from the token index in %.1f ms",
+            len(removed_digests),
+            (time.perf_counter() - reconciliation_start) * 1000,
+        )
+
+    @staticmethod
+    def _revoked_digests(batch: dict[int, bytes]) -> list[bytes]:
+        active_token_ids = database.crud.get_active_access_token_ids(batch.keys())
+        return [digest for token_id, digest in batch.items() if token_id not in active_token_ids]
@@ -0,0 +1,84 @@
+"""Preloading of the caches before the service starts consuming messages"""
+import logging
+import threading
+import time
+
+import database.cache
+import database.crud
+
+_logger = logging.getLogger(__name__)
+
+_TOKEN_CHUNK_SIZE = 1000
+"""The number of access tokens whose accounts and scopes are loaded in a single query"""
+
+
+def warm_up_caches(token_budget: int) -> None:
+    """
+    Load the scope catalog and the most recently created, still valid access tokens together with
+    their accounts and scopes into the caches
+
+    :param token_budget: The maximal number of access tokens which are loaded
+    :type token_budget: int
+    """
+    phase_start = time.perf_counter()
+    scopes = database.crud.get_all_scopes()
+    _logger.info(
+        "Loaded %s scopes into the cache in %.1f ms",
+        len(scopes),
+        (time.perf_counter() - phase_start) * 1000,
+    )
+    if token_budget <= 0:
+        return
+    phase_start = time.perf_counter()
+    tokens = database.crud.get_recent_access_tokens(token_budget)
+    account_ids: set[int] = set()
+    for chunk_start in range(0, len(tokens), _TOKEN_CHUNK_SIZE):
+        chunk = tokens[chunk_start : chunk_start + _TOKEN_CHUNK_SIZE]
+        scope_ids = database.crud.get_access_token_scope_ids([token.id for token in chunk])
+        for token in chunk:
+            database.cache.access_tokens.set(token.value.get_secret_value(), token)
+            database.cache.access_token_scopes.set(token.id, scope_ids[token.id])
+        new_account_ids = {token.owner_id for token in chunk} - account_ids
+        for user in database.crud.get_user_accounts(new_account_ids):
+            database.cache.accounts.set(user.id, user)
+        account_ids |= new_account_ids
+    _logger.info(
+        "Loaded %s access tokens and %s accounts into the cache in %.1f ms",
+        len(tokens),
+        len(account_ids),
+        (time.perf_counter() - phase_start) * 1000,
+    )
+
+
+def run(token_budget: int, timeout: float) -> bool:
+    """
+    Warm up the caches and wait until the warm-up finished or the timeout is reached.
+
+    A warm-up which did not finish in time continues in the background
+
+    :param token_budget: The maximal number of access tokens which are loaded
+    :type token_budget: int
+    :param timeout: The maximal number of seconds waited for the warm-up
+    :type timeout: float
+    :return: ``True`` if the warm-up finished in time
+    :rtype: bool
+    """
+
+    def _warm_up():
+        try:
+            warm_up_caches(token_budget)
+        except Exception as e:
+            _logger.error("The warm-up of the caches failed", exc_info=e)
+
+    if not database.cache.is_enabled():
+        _logger.warning("Skipping the cache warm-up since the query cache is disabled")
+        return True
+    warm_up_thread = threading.Thread(target=_warm_up, name="cache-warm-up", daemon=True)
+    warm_up_thread.start()
+    warm_up_thread.join(timeout)
+    if warm_up_thread.is_alive():
+        _logger.warning(
+            "The cache warm-up did not finish within %ss. Continuing it in the background", timeout
+        )
+        return False
+    return True
@@ -0,0 +1,37 @@
+"""Shared fixtures of the tests"""
+import pytest
+
+import database
+import database.breaker
+import database.cache
+from benchmarks import fixtures
+
+
+@pytest.fixture
+def seeded_database() -> fixtures.SeededData:
+    """A seeded in-memory SQLite stand-in installed as the database of the service"""
+    fixtures.create_engine()
+    data = fixtures.seed(account_count=10, scope_count=8, token_count=20, scope_counts=(1, 4))
+    yield data
+    database.engine.dispose()
+
+
+@pytest.fixture
+def caches(monkeypatch) -> None:
+    """Enabled and empty query caches which are replaced after the test"""
+    for name in database.cache._CACHE_NAMES:
+        monkeypatch.setattr(database.cache, name, database.cache.TTLCache(max_size=1000, ttl=30.0))
+
+
+@pytest.fixture
+def circuit_breaker(monkeypatch) -> database.breaker.CircuitBreaker:
+    """A circuit breaker which is replaced after the test and does not probe the database"""
+
+    def _probe():
+        raise ConnectionError("The tests do not probe the database")
+
+    breaker = database.breaker.CircuitBreaker(
+        failure_threshold=1, probe_interval=60.0, probe=_probe
+    )
+    monkeypatch.setattr(database.breaker, "circuit_breaker", breaker)
+    return breaker
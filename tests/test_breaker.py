@@ -0,0 +1,64 @@
+"""Tests of the circuit breaker guarding the primary database"""
+import threading
+import time
+
+import database.breaker
+
+
+def _failing_probe():
+    raise ConnectionError("The database is unreachable")
+
+
+def _breaker(
+    failure_threshold: int, probe=_failing_probe, probe_interval: float = 60.0
+) -> database.breaker.CircuitBreaker:
+    return database.breaker.CircuitBreaker(
+        failure_threshold=failure_threshold, probe_interval=probe_interval, probe=probe
+    )
+
+
+def test_opens_after_consecutive_failures():
+    breaker = _breaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state is database.breaker.State.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = _breaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_zero_threshold_disables_the_breaker():
+    breaker = _breaker(failure_threshold=0)
+    for _ in range(100):
+        breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_closes_after_a_successful_probe():
+    database_reachable = threading.Event()
+
+    def probe():
+        if not database_reachable.is_set():
+            _failing_probe()
+
+    breaker = _breaker(failure_threshold=1, probe=probe, probe_interval=0.01)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.05)
+    assert not breaker.allow()
+    database_reachable.set()
+    deadline = time.monotonic() + 5.0
+    while not breaker.allow() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert breaker.state is database.breaker.State.CLOSED
+    # A single failure after the recovery opens the circuit again
+    breaker.record_failure()
+    assert not breaker.allow()
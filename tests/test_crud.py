@@ -0,0 +1,75 @@
+"""Tests of the database operations of the token introspection"""
+import pytest
+import sqlalchemy
+
+import database
+import database.cache
+import database.crud
+import database.tables
+import tokenindex
+from benchmarks import fixtures
+
+
+@pytest.fixture
+def lagging_replica(monkeypatch, seeded_database) -> fixtures.SeededData:
+    """An empty read replica which did not receive any of the seeded rows yet"""
+    primary_engine = database.engine
+    replica_engine = fixtures.create_engine()
+    monkeypatch.setattr(database, "engine", primary_engine)
+    monkeypatch.setattr(database, "replica_engine", replica_engine)
+    yield seeded_database
+    replica_engine.dispose()
+
+
+def test_replica_misses_are_read_from_the_primary(lagging_replica):
+    token = database.crud.get_access_token_data(lagging_replica.access_tokens[0])
+    assert token is not None
+    assert database.crud.get_user_account(token.owner_id) is not None
+    assert database.crud.get_account_snapshot(token.owner_id) is not None
+    assert not database.crud.is_access_token_revoked(token.id)
+
+
+def test_missing_rows_are_reported_after_checking_the_primary(lagging_replica):
+    assert database.crud.get_access_token_data("not-a-token") is None
+    assert database.crud.is_access_token_revoked(1_000_000)
+
+
+@pytest.fixture
+def indexed_token(monkeypatch, tmp_path, seeded_database, caches) -> tuple[str, int]:
+    """The value and id of a seeded access token which is also stored in the token index"""
+    token_index = tokenindex.TokenIndex(str(tmp_path / "token-index"), capacity=1024)
+    monkeypatch.setattr(database.crud, "token_index", token_index)
+    token_value = seeded_database.access_tokens[0]
+    token = database.crud.get_access_token_data(token_value)
+    token_index.store(
+        [
+            tokenindex.IndexedToken(
+                digest=bytes.fromhex(token.value.get_secret_value()),
+                token_id=token.id,
+                expires=token.expires,
+                created=token.created,
+                owner_id=token.owner_id,
+                scope_ids=None,
+            )
+        ],
+        high_water_mark=token.id,
+    )
+    database.cache.access_tokens.clear()
+    yield token_value, token.id
+    token_index.close()
+
+
+def test_indexed_tokens_are_found(indexed_token):
+    token_value, token_id = indexed_token
+    assert database.crud.get_access_token_data(token_value).id == token_id
+
+
+def test_indexed_tokens_revoked_by_other_services_are_rejected(indexed_token):
+    token_value, token_id = indexed_token
+    with database.engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.update(database.tables.access_token)
+            .where(database.tables.access_token.c.id == token_id)
+            .values(active=False)
+        )
+    assert database.crud.get_access_token_data(token_value) is None
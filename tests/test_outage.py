@@ -0,0 +1,71 @@
+"""Tests of the token introspection while the circuit breaker is open"""
+import pytest
+import ujson
+
+import database.breaker
+import database.cache
+import database.crud
+import enums
+import server_functions
+
+
+@pytest.fixture
+def expired_caches(monkeypatch, caches):
+    """Query caches whose entries expire immediately but are kept for the grace period"""
+    for name in database.cache._CACHE_NAMES:
+        monkeypatch.setattr(database.cache, name, database.cache.TTLCache(max_size=1000, ttl=0.0))
+    monkeypatch.setattr(database.breaker, "stale_grace_period", 300.0)
+
+
+def _introspect(token: str, scopes: list[str]) -> dict:
+    message = {"action": enums.Action.CHECK_TOKEN_SCOPE.value, "token": token, "scopes": scopes}
+    return ujson.loads(server_functions.executor(ujson.dumps(message).encode("utf-8")))
+
+
+def _open(breaker: database.breaker.CircuitBreaker) -> None:
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_cached_tokens_are_served_while_the_circuit_is_open(
+    seeded_database, expired_caches, circuit_breaker
+):
+    token = seeded_database.access_tokens[0]
+    scopes = seeded_database.token_scopes[token]
+    assert _introspect(token, scopes)["active"]
+    _open(circuit_breaker)
+    assert _introspect(token, scopes)["active"]
+
+
+def test_locally_revoked_tokens_are_not_served_while_the_circuit_is_open(
+    seeded_database, expired_caches, circuit_breaker
+):
+    token = seeded_database.access_tokens[1]
+    scopes = seeded_database.token_scopes[token]
+    assert _introspect(token, scopes)["active"]
+    database.crud.delete_access_token(database.crud.get_access_token_data(token))
+    _open(circuit_breaker)
+    reply = _introspect(token, scopes)
+    assert not reply.get("active", False)
+    assert reply["error"].endswith(".DATABASE_UNAVAILABLE")
+
+
+def test_tokens_cached_as_revoked_are_not_served_while_the_circuit_is_open(
+    seeded_database, expired_caches, circuit_breaker
+):
+    token = seeded_database.access_tokens[2]
+    scopes = seeded_database.token_scopes[token]
+    assert _introspect(token, scopes)["active"]
+    database.cache.revocations.set(database.crud.get_access_token_data(token).id, True)
+    _open(circuit_breaker)
+    reply = _introspect(token, scopes)
+    assert not reply["active"]
+    assert reply["reason"] == enums.TokenIntrospectionFailure.INVALID_TOKEN.value
+
+
+def test_uncached_tokens_are_not_served_while_the_circuit_is_open(
+    seeded_database, expired_caches, circuit_breaker
+):
+    _open(circuit_breaker)
+    reply = _introspect(seeded_database.access_tokens[3], [])
+    assert reply["error"].endswith(".DATABASE_UNAVAILABLE")
@@ -0,0 +1,89 @@
+"""Tests of the rendezvous hashing assigning the shards to the replicas"""
+import sqlalchemy
+
+import database
+import database.tables
+import sharding
+
+_SHARD_COUNT = 64
+
+
+def _owners(assignment: dict[str, set[int]]) -> dict[int, str]:
+    return {shard: replica_id for replica_id, shards in assignment.items() for shard in shards}
+
+
+def test_every_shard_is_assigned_to_exactly_one_replica():
+    assignment = sharding.assign_shards(_SHARD_COUNT, ["a", "b", "c"])
+    assert sorted(shard for shards in assignment.values() for shard in shards) == list(
+        range(_SHARD_COUNT)
+    )
+    assert all(len(shards) > 0 for shards in assignment.values())
+
+
+def test_assignment_does_not_depend_on_the_order_of_the_replicas():
+    assert sharding.assign_shards(_SHARD_COUNT, ["a", "b", "c"]) == sharding.assign_shards(
+        _SHARD_COUNT, ["c", "a", "b", "a"]
+    )
+
+
+def test_joining_replica_only_takes_over_shards():
+    before = _owners(sharding.assign_shards(_SHARD_COUNT, ["a", "b", "c"]))
+    after = _owners(sharding.assign_shards(_SHARD_COUNT, ["a", "b", "c", "d"]))
+    moved_shards = {shard for shard in range(_SHARD_COUNT) if before[shard] != after[shard]}
+    assert len(moved_shards) > 0
+    assert all(after[shard] == "d" for shard in moved_shards)
+
+
+def test_leaving_replica_only_releases_its_own_shards():
+    before = _owners(sharding.assign_shards(_SHARD_COUNT, ["a", "b", "c"]))
+    after = _owners(sharding.assign_shards(_SHARD_COUNT, ["a", "b"]))
+    moved_shards = {shard for shard in range(_SHARD_COUNT) if before[shard] != after[shard]}
+    assert moved_shards == {shard for shard, owner in before.items() if owner == "c"}
+
+
+def test_no_replicas_own_no_shards():
+    assert sharding.assign_shards(_SHARD_COUNT, []) == {}
+
+
+def test_shard_of_is_stable_and_in_range():
+    shards = [sharding.shard_of(f"token-{index}", _SHARD_COUNT) for index in range(1000)]
+    assert shards == [sharding.shard_of(f"token-{index}", _SHARD_COUNT) for index in range(1000)]
+    assert set(shards) == set(range(_SHARD_COUNT))
+
+
+def _manager(started: list[int], stopped: list[int]) -> sharding.ShardManager:
+    return sharding.ShardManager(
+        replica_id="a",
+        shard_count=_SHARD_COUNT,
+        heartbeat_interval=0.0,
+        replica_timeout=10.0,
+        start_consumer=lambda shard: started.append(shard) or shard,
+        stop_consumer=stopped.append,
+    )
+
+
+def test_rebalance_starts_and_releases_consumers():
+    started, stopped = [], []
+    manager = _manager(started, stopped)
+    manager.rebalance({1, 2, 3})
+    assert sorted(manager.active_consumers()) == [1, 2, 3] == started
+    manager.rebalance({2, 3, 4})
+    assert sorted(manager.active_consumers()) == [2, 3, 4]
+    assert stopped == [1]
+
+
+def test_active_consumers_is_a_snapshot():
+    manager = _manager([], [])
+    manager.rebalance({1, 2})
+    consumers = manager.active_consumers()
+    manager.rebalance({3})
+    assert sorted(consumers) == [1, 2]
+    assert manager.active_consumers() == [3]
+
+
+def test_create_schema_creates_the_replica_table(seeded_database):
+    sharding.create_schema()
+    sharding.create_schema()
+    assert sqlalchemy.inspect(database.engine).has_table(
+        database.tables.service_replicas.name, schema=database.tables.service_replicas.schema
+    )
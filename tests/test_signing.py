@@ -0,0 +1,124 @@
+"""Tests of the verification of signed access tokens"""
+import datetime
+
+import pydantic
+import pytest
+
+import enums
+import models.requests
+import models.responses
+import settings
+import signing
+import tools
+
+_KEY = b"test-signing-key"
+
+
+def _issue(expires_in: datetime.timedelta = datetime.timedelta(hours=1), key: bytes = _KEY) -> str:
+    now = datetime.datetime.now(tz=datetime.timezone.utc).replace(microsecond=0)
+    return signing.issue(
+        token_id=42,
+        expires=now + expires_in,
+        created=now - datetime.timedelta(minutes=1),
+        owner_id=7,
+        scopes=["me", "scope:1"],
+        key=key,
+    )
+
+
+def test_verify_returns_the_claims():
+    token = _issue()
+    assert signing.is_signed_token(token)
+    signed_token = signing.verify(token, _KEY)
+    assert signed_token is not None
+    assert signed_token.token_id == 42
+    assert signed_token.owner_id == 7
+    assert signed_token.scopes == ("me", "scope:1")
+    assert signed_token.created < signed_token.expires
+
+
+def test_verify_rejects_a_tampered_payload():
+    prefix, payload, signature = _issue().split(".")
+    other_payload = _issue(expires_in=datetime.timedelta(days=365)).split(".")[1]
+    assert other_payload != payload
+    assert signing.verify(f"{prefix}.{other_payload}.{signature}", _KEY) is None
+
+
+def test_verify_rejects_a_tampered_signature():
+    message, _, signature = _issue().rpartition(".")
+    tampered_signature = signature[:10] + ("A" if signature[10] != "A" else "B") + signature[11:]
+    tampered_token = f"{message}.{tampered_signature}"
+    assert signing.verify(tampered_token, _KEY) is None
+
+
+def test_verify_rejects_a_token_signed_with_another_key():
+    assert signing.verify(_issue(key=b"another-key"), _KEY) is None
+
+
+def test_verify_rejects_malformed_tokens():
+    assert signing.verify("not-a-signed-token", _KEY) is None
+    assert signing.verify(f"{signing.PREFIX}.%%%.%%%", _KEY) is None
+    assert signing.verify(f"{signing.PREFIX}.a.b.c", _KEY) is None
+
+
+def test_verify_keeps_the_expiry_of_an_expired_token():
+    # The expiry is checked by the introspection, which reports expired tokens as such
+    signed_token = signing.verify(_issue(expires_in=-datetime.timedelta(hours=1)), _KEY)
+    assert signed_token is not None
+    assert signed_token.expires < datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+@pytest.fixture
+def signed_tokens(monkeypatch, seeded_database, caches):
+    monkeypatch.setattr(
+        tools,
+        "signed_token_settings",
+        settings.SignedTokenConfiguration.construct(
+            enabled=True, secret_key=pydantic.SecretStr(_KEY.decode("utf-8"))
+        ),
+    )
+
+
+def _introspect(token: str) -> models.responses.TokenIntrospection:
+    return tools.run_token_introspection(
+        models.requests.TokenValidationData(action=enums.Action.CHECK_TOKEN_SCOPE, token=token)
+    )
+
+
+def _issue_for_seeded_token(expires_in: datetime.timedelta, key: bytes = _KEY) -> str:
+    now = datetime.datetime.now(tz=datetime.timezone.utc).replace(microsecond=0)
+    return signing.issue(
+        token_id=1,
+        expires=now + expires_in,
+        created=now - datetime.timedelta(minutes=1),
+        owner_id=1,
+        scopes=["scope:0"],
+        key=key,
+    )
+
+
+def test_introspection_accepts_a_valid_signed_token(signed_tokens):
+    assert _introspect(_issue_for_seeded_token(datetime.timedelta(hours=1))).active
+
+
+def test_introspection_reports_an_expired_signed_token(signed_tokens):
+    introspection = _introspect(_issue_for_seeded_token(-datetime.timedelta(hours=1)))
+    assert not introspection.active
+    assert introspection.reason is enums.TokenIntrospectionFailure.EXPIRED
+
+
+def test_introspection_rejects_a_signed_token_with_another_key(signed_tokens):
+    introspection = _introspect(
+        _issue_for_seeded_token(datetime.timedelta(hours=1), key=b"another-key")
+    )
+    assert not introspection.active
+    assert introspection.reason is enums.TokenIntrospectionFailure.INVALID_TOKEN
+
+
+def test_verify_rejects_another_encoding_of_the_signature():
+    message, _, signature = _issue().rpartition(".")
+    # The last character of an encoded 32 byte signature carries two unused bits
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    last_index = alphabet.index(signature[-1])
+    other_encoding = signature[:-1] + alphabet[last_index ^ 1]
+    assert signing.verify(f"{message}.{other_encoding}", _KEY) is None
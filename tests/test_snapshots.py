@@ -0,0 +1,24 @@
+"""Tests of the account snapshot migration"""
+import pytest
+import sqlalchemy
+
+import database
+import database.crud
+import database.tables
+import tasks.snapshots
+
+
+def test_migrate_creates_the_missing_snapshots(seeded_database, caches):
+    with database.engine.begin() as connection:
+        connection.execute(sqlalchemy.delete(database.tables.account_snapshots))
+    assert tasks.snapshots.migrate() == len(seeded_database.account_ids)
+    assert tasks.snapshots.migrate() == 0
+    tasks.snapshots.check_schema()
+    snapshot = database.crud.get_account_snapshot(seeded_database.account_ids[0])
+    assert snapshot is not None and snapshot.active
+
+
+def test_check_schema_rejects_a_missing_table(seeded_database):
+    database.tables.account_snapshots.drop(bind=database.engine)
+    with pytest.raises(RuntimeError):
+        tasks.snapshots.check_schema()
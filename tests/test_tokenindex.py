@@ -0,0 +1,124 @@
+"""Tests of the memory-mapped token index"""
+import datetime
+import hashlib
+
+import pytest
+
+import tokenindex
+
+_NOW = datetime.datetime.now(tz=datetime.timezone.utc).replace(microsecond=0)
+
+
+def _token(token_id: int, owner_id: int = 1, scope_ids=(1, 2)) -> tokenindex.IndexedToken:
+    return tokenindex.IndexedToken(
+        digest=hashlib.sha3_224(f"token-{token_id}".encode("utf-8")).digest(),
+        token_id=token_id,
+        expires=_NOW + datetime.timedelta(hours=1),
+        created=_NOW - datetime.timedelta(minutes=1),
+        owner_id=owner_id,
+        scope_ids=scope_ids,
+    )
+
+
+@pytest.fixture
+def index(tmp_path) -> tokenindex.TokenIndex:
+    token_index = tokenindex.TokenIndex(str(tmp_path / "token-index"), capacity=1024)
+    yield token_index
+    token_index.close()
+
+
+def test_stored_tokens_are_found(index):
+    tokens = [_token(token_id) for token_id in range(1, 101)]
+    assert index.store(tokens, high_water_mark=100) == 0
+    assert len(index) == 100
+    assert index.high_water_mark == 100
+    for token in tokens:
+        assert index.lookup(token.digest) == token
+    assert index.lookup(_token(1000).digest) is None
+
+
+def test_storing_a_token_again_updates_it(index):
+    index.store([_token(1, scope_ids=(1,))], high_water_mark=1)
+    index.store([_token(1, scope_ids=(3, 4))], high_water_mark=1)
+    assert len(index) == 1
+    assert index.lookup(_token(1).digest).scope_ids == (3, 4)
+
+
+def test_high_water_mark_only_advances(index):
+    index.store([_token(5)], high_water_mark=5)
+    index.store([_token(3)], high_water_mark=3)
+    assert index.high_water_mark == 5
+
+
+def test_scopes_outside_of_the_bitmask_are_not_stored(index):
+    index.store([_token(1, scope_ids=(1, tokenindex.MAX_SCOPE_ID + 1))], high_water_mark=1)
+    assert index.lookup(_token(1).digest).scope_ids is None
+
+
+def test_removed_tokens_are_not_found(index):
+    index.store([_token(token_id) for token_id in range(1, 11)], high_water_mark=10)
+    index.remove([_token(3).digest, _token(1000).digest])
+    assert index.lookup(_token(3).digest) is None
+    assert index.lookup(_token(4).digest) is not None
+    assert len(index) == 9
+
+
+def test_remove_owner_removes_all_tokens_of_the_account(index):
+    index.store(
+        [_token(token_id, owner_id=token_id % 2) for token_id in range(1, 11)], high_water_mark=10
+    )
+    index.remove_owner(0)
+    assert all(
+        (index.lookup(_token(token_id).digest) is None) == (token_id % 2 == 0)
+        for token_id in range(1, 11)
+    )
+
+
+def test_live_records_lists_the_stored_tokens(index):
+    index.store([_token(token_id) for token_id in range(1, 11)], high_water_mark=10)
+    index.remove([_token(1).digest])
+    records = {token_id: (digest, expires) for digest, token_id, expires in index.live_records()}
+    assert sorted(records) == list(range(2, 11))
+    assert records[2] == (_token(2).digest, _token(2).expires)
+
+
+def test_compact_keeps_the_live_tokens(index):
+    tokens = [_token(token_id) for token_id in range(1, 801)]
+    index.store(tokens, high_water_mark=800)
+    index.remove([token.digest for token in tokens[:600]])
+    assert index.compact(max_tombstone_share=0.25)
+    assert not index.compact(max_tombstone_share=0.25)
+    assert len(index) == 200
+    for token in tokens[:600]:
+        assert index.lookup(token.digest) is None
+    for token in tokens[600:]:
+        assert index.lookup(token.digest) == token
+    # The slots of the removed tokens can be used again
+    assert index.store([_token(token_id) for token_id in range(801, 1401)], 1400) == 0
+
+
+def test_full_index_rejects_new_tokens(index):
+    rejected_tokens = index.store([_token(token_id) for token_id in range(1, 1025)], 1024)
+    assert rejected_tokens == 1024 - int(1024 * 0.9)
+
+
+def test_index_is_shared_through_the_file(index):
+    index.store([_token(1)], high_water_mark=1)
+    other_process_index = tokenindex.TokenIndex(index.path, capacity=1024)
+    try:
+        assert other_process_index.lookup(_token(1).digest) == _token(1)
+        other_process_index.remove([_token(1).digest])
+        assert index.lookup(_token(1).digest) is None
+    finally:
+        other_process_index.close()
+
+
+def test_unusable_files_are_replaced(tmp_path):
+    path = tmp_path / "token-index"
+    path.write_bytes(b"not an index")
+    token_index = tokenindex.TokenIndex(str(path), capacity=1024)
+    try:
+        assert len(token_index) == 0
+        assert token_index.capacity == 1024
+    finally:
+        token_index.close()
@@ -0,0 +1,74 @@
+"""Tests of the MessagePack encoding of the requests and replies"""
+import msgpack
+import ujson
+
+import enums
+import models.responses
+import server_functions
+import wire
+
+
+def test_json_messages_are_not_detected_as_msgpack():
+    assert not wire.is_msgpack(ujson.dumps({"action": "check_token"}).encode("utf-8"))
+    assert not wire.is_msgpack(b'["check_token", "token"]')
+    assert not wire.is_msgpack(b"  {}")
+    assert not wire.is_msgpack(b"")
+
+
+def test_msgpack_maps_and_arrays_are_detected():
+    assert wire.is_msgpack(msgpack.packb({"action": "check_token"}))
+    assert wire.is_msgpack(msgpack.packb(["check_token", "token"]))
+    # Maps and arrays beyond the fixed size formats use other type bytes
+    assert wire.is_msgpack(msgpack.packb({str(index): index for index in range(20)}))
+    assert wire.is_msgpack(msgpack.packb(list(range(20))))
+
+
+def test_array_requests_are_decoded_into_the_json_structure():
+    message = msgpack.packb(["check_token", "token", ["me"], 1700000000.0])
+    assert wire.decode_request(message) == {
+        "action": "check_token",
+        "token": "token",
+        "scopes": ["me"],
+        "deadline": 1700000000.0,
+    }
+    assert wire.decode_request(msgpack.packb(["check_token", "token"])) == {
+        "action": "check_token",
+        "token": "token",
+    }
+
+
+def test_map_requests_are_decoded_unchanged():
+    content = {"action": "check_token", "token": "token", "scopes": None}
+    assert wire.decode_request(msgpack.packb(content)) == content
+
+
+def test_introspections_are_encoded_as_arrays():
+    introspection = models.responses.TokenIntrospection(
+        active=False, reason=enums.TokenIntrospectionFailure.EXPIRED
+    )
+    assert msgpack.unpackb(wire.encode_introspection(introspection)) == [
+        False,
+        enums.TokenIntrospectionFailure.EXPIRED.value,
+        None,
+        None,
+        None,
+        None,
+        None,
+    ]
+
+
+def test_msgpack_requests_are_answered_with_msgpack(seeded_database):
+    token = seeded_database.access_tokens[0]
+    message = msgpack.packb(
+        [enums.Action.CHECK_TOKEN_SCOPE.value, token, seeded_database.token_scopes[token]]
+    )
+    reply = msgpack.unpackb(server_functions.executor(message))
+    assert reply[0] is True
+    assert reply[6][0] == 1
+
+
+def test_json_requests_are_answered_with_json(seeded_database):
+    token = seeded_database.access_tokens[0]
+    message = ujson.dumps({"action": enums.Action.CHECK_TOKEN_SCOPE.value, "token": token})
+    reply = ujson.loads(server_functions.executor(message.encode("utf-8")))
+    assert reply["active"] is True
@@ -0,0 +1,407 @@
+"""
+A memory-mapped index of the access tokens which is shared by all service processes on a node
+
+The index is a file of fixed size records in an open addressing hash table keyed by the SHA3-224
+digest of the token. Every record holds the id, expiry, creation time and owner of a token together
+with a bitmask of the ids of its scopes. The file is mapped into the memory of every process, so a
+lookup does not leave the process and the node holds a single copy of the tokens.
+
+Writes are serialized across the processes by an exclusive ``flock`` on a lock file next to the
+index and announced by a sequence counter in the header: it is odd while a write is in progress
+and readers retry a lookup if the counter changed while they read (a sequence lock). The index is
+filled by a single elected process (see :mod:`tasks.tokenindex`), while every process may remove
+the tokens it revoked itself. Lookups which do not find a token are not authoritative since the
+index trails the database, so the callers fall back to the database on a miss
+"""
+import contextlib
+import dataclasses
+import datetime
+import mmap
+import os
+import struct
+import threading
+import typing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_MAGIC = b"WTI1"
+"""The marker at the start of every index file"""
+
+_LAYOUT_VERSION = 1
+"""The version of the file layout"""
+
+_HEADER = struct.Struct("!4sIQQQQQ")
+"""magic, layout version, capacity, sequence, high water mark, live records, used slots"""
+
+_HEADER_SIZE = 64
+"""The number of bytes reserved for the header"""
+
+_SEQUENCE_OFFSET = 16
+_HIGH_WATER_MARK_OFFSET = 24
+_COUNTERS_OFFSET = 32
+
+_RECORD = struct.Struct("!28sBBxxQqqQ32s")
+"""digest, state, flags, token id, expires, created, owner id, scope bitmask"""
+
+_EMPTY = 0
+_LIVE = 1
+_TOMBSTONE = 2
+
+_SCOPES_INCOMPLETE = 0x01
+"""The token has scopes whose ids do not fit into the bitmask"""
+
+MAX_SCOPE_ID = 256
+"""The highest scope id which can be stored in the bitmask"""
+
+_MAX_LOAD_FACTOR = 0.9
+"""The share of the slots which may be used before new tokens are rejected"""
+
+_MAX_READ_ATTEMPTS = 8
+"""The number of times a lookup is retried while the index is written"""
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def is_available() -> bool:
+    """Check if the token index is supported on this platform"""
+    return fcntl is not None
+
+
+@dataclasses.dataclass(frozen=True)
+class IndexedToken:
+    """An access token as it is stored in the index"""
+
+    digest: bytes
+    """The SHA3-224 digest of the token value"""
+
+    token_id: int
+    """The internal database id of the token"""
+
+    expires: datetime.datetime
+    """The time and date of expiration"""
+
+    created: datetime.datetime
+    """The time and date on which the token has been created"""
+
+    owner_id: int
+    """The id of the account this token is associated to"""
+
+    scope_ids: typing.Optional[tuple[int, ...]]
+    """The ids of the scopes of the token or ``None`` if they could not be stored in the index"""
+
+
+def _to_microseconds(timestamp: datetime.datetime) -> int:
+    return (timestamp - _EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _from_microseconds(microseconds: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(microseconds=microseconds)
+
+
+def _encode_scope_ids(scope_ids: typing.Iterable[int]) -> tuple[int, bytes]:
+    bitmask = 0
+    flags = 0
+    for scope_id in scope_ids:
+        if 0 < scope_id <= MAX_SCOPE_ID:
+            bitmask |= 1 << (scope_id - 1)
+        else:
+            flags |= _SCOPES_INCOMPLETE
+    return flags, bitmask.to_bytes(MAX_SCOPE_ID // 8, "big")
+
+
+def _decode_scope_ids(flags: int, encoded_bitmask: bytes) -> typing.Optional[tuple[int, ...]]:
+    if flags & _SCOPES_INCOMPLETE:
+        return None
+    bitmask = int.from_bytes(encoded_bitmask, "big")
+    return tuple(bit + 1 for bit in range(bitmask.bit_length()) if bitmask >> bit & 1)
+
+
+class TokenIndex:
+    """A memory-mapped hash table of access tokens shared between processes"""
+
+    def __init__(self, path: str, capacity: int):
+        """
+        Open the index file or create it if it does not exist or is unusable
+
+        :param path: The path of the index file. The lock file is created next to it
+        :type path: str
+        :param capacity: The number of slots of a newly created index (rounded to a power of two)
+        :type capacity: int
+        """
+        if fcntl is None:
+            raise RuntimeError("The token index requires a platform supporting fcntl")
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(f"{path}.lock", "a+b")
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        with self._file_lock():
+            self._file_descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if not self._is_valid():
+                os.ftruncate(self._file_descriptor, 0)
+                os.ftruncate(self._file_descriptor, _HEADER_SIZE + capacity * _RECORD.size)
+                os.pwrite(
+                    self._file_descriptor,
+                    _HEADER.pack(_MAGIC, _LAYOUT_VERSION, capacity, 0, 0, 0, 0),
+                    0,
+                )
+            self._map = mmap.mmap(self._file_descriptor, 0, access=mmap.ACCESS_WRITE)
+        self.capacity = _HEADER.unpack_from(self._map, 0)[2]
+        self._mask = self.capacity - 1
+
+    def _is_valid(self) -> bool:
+        """Check if the opened file is an index with the current layout"""
+        header = os.pread(self._file_descriptor, _HEADER.size, 0)
+        if len(header) < _HEADER.size:
+            return False
+        magic, layout_version, capacity, *_ = _HEADER.unpack(header)
+        return (
+            magic == _MAGIC
+            and layout_version == _LAYOUT_VERSION
+            and capacity > 0
+            and capacity & (capacity - 1) == 0
+            and os.fstat(self._file_descriptor).st_size == _HEADER_SIZE + capacity * _RECORD.size
+        )
+
+    def close(self) -> None:
+        """Unmap the index and close the files"""
+        self._map.close()
+        os.close(self._file_descriptor)
+        self._lock_file.close()
+
+    @property
+    def high_water_mark(self) -> int:
+        """The highest id of the tokens which have been read from the database"""
+        return struct.unpack_from("!Q", self._map, _HIGH_WATER_MARK_OFFSET)[0]
+
+    def __len__(self) -> int:
+        return struct.unpack_from("!Q", self._map, _COUNTERS_OFFSET)[0]
+
+    # %% Reading
+    def lookup(self, digest: bytes) -> typing.Optional[IndexedToken]:
+        """
+        Look up a token by its digest
+
+        :param digest: The SHA3-224 digest of the token value
+        :type digest: bytes
+        :return: The token or ``None`` if it is not in the index or the index is being rewritten
+        :rtype: typing.Optional[IndexedToken]
+        """
+        for _ in range(_MAX_READ_ATTEMPTS):
+            sequence = struct.unpack_from("!Q", self._map, _SEQUENCE_OFFSET)[0]
+            if sequence % 2 == 1:
+                continue
+            slot = self._find(digest)
+            record = None if slot is None else _RECORD.unpack_from(self._map, self._offset(slot))
+            if struct.unpack_from("!Q", self._map, _SEQUENCE_OFFSET)[0] != sequence:
+                continue
+            if record is None:
+                return None
+            _, _, flags, token_id, expires, created, owner_id, encoded_bitmask = record
+            return IndexedToken(
+                digest=digest,
+                token_id=token_id,
+                expires=_from_microseconds(expires),
+                created=_from_microseconds(created),
+                owner_id=owner_id,
+                scope_ids=_decode_scope_ids(flags, encoded_bitmask),
+            )
+        return None
+
+    def live_records(self) -> typing.Iterator[tuple[bytes, int, datetime.datetime]]:
+        """
+        Iterate over the digest, id and expiry of all tokens in the index.
+
+        The records are copied while holding the lock, so the iteration sees a consistent state
+        of the index and does not block the writers while it is consumed
+
+        :return: The digest, id and expiry of the tokens
+        :rtype: typing.Iterator[tuple[bytes, int, datetime.datetime]]
+        """
+        with self._file_lock():
+            records = self._map[: self._offset(self.capacity)]
+        for slot in range(self.capacity):
+            digest, state, _, token_id, expires, *_ = _RECORD.unpack_from(
+                records, self._offset(slot)
+            )
+            if state == _LIVE:
+                yield digest, token_id, _from_microseconds(expires)
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def _home_slot(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "big") & self._mask
+
+    def _find(self, digest: bytes) -> typing.Optional[int]:
+        """Get the slot holding the token with the digest"""
+        slot = self._home_slot(digest)
+        for _ in range(self.capacity):
+            offset = self._offset(slot)
+            state = self._map[offset + 28]
+            if state == _EMPTY:
+                return None
+            if state == _LIVE and self._map[offset : offset + 28] == digest:
+                return slot
+            slot = (slot + 1) & self._mask
+        return None
+
+    # %% Writing
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Hold the exclusive lock on the index across threads and processes"""
+        with self._thread_lock:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Hold the lock and mark the index as being written for the duration of the block"""
+        with self._file_lock():
+            sequence = struct.unpack_from("!Q", self._map, _SEQUENCE_OFFSET)[0]
+            # A process killed during a write leaves an odd sequence behind
+            sequence += sequence % 2
+            struct.pack_into("!Q", self._map, _SEQUENCE_OFFSET, sequence + 1)
+            try:
+                yield
+            finally:
+                struct.pack_into("!Q", self._map, _SEQUENCE_OFFSET, sequence + 2)
+
+    def _adjust_counters(self, live_records: int, used_slots: int) -> None:
+        current_live_records, current_used_slots = struct.unpack_from(
+            "!QQ", self._map, _COUNTERS_OFFSET
+        )
+        struct.pack_into(
+            "!QQ",
+            self._map,
+            _COUNTERS_OFFSET,
+            current_live_records + live_records,
+            current_used_slots + used_slots,
+        )
+
+    def store(self, tokens: typing.Iterable[IndexedToken], high_water_mark: int) -> int:
+        """
+        Add or update tokens and advance the high water mark
+
+        :param tokens: The tokens which shall be stored
+        :type tokens: typing.Iterable[IndexedToken]
+        :param high_water_mark: The highest token id which has been read from the database
+        :type high_water_mark: int
+        :return: The number of tokens which were rejected since the index is full
+        :rtype: int
+        """
+        rejected_tokens = 0
+        with self._writing():
+            for token in tokens:
+                if not self._store(token):
+                    rejected_tokens += 1
+            if high_water_mark > self.high_water_mark:
+                struct.pack_into("!Q", self._map, _HIGH_WATER_MARK_OFFSET, high_water_mark)
+        return rejected_tokens
+
+    def _store(self, token: IndexedToken) -> bool:
+        flags, encoded_bitmask = _encode_scope_ids(token.scope_ids or ())
+        if token.scope_ids is None:
+            flags |= _SCOPES_INCOMPLETE
+        record = _RECORD.pack(
+            token.digest,
+            _LIVE,
+            flags,
+            token.token_id,
+            _to_microseconds(token.expires),
+            _to_microseconds(token.created),
+            token.owner_id,
+            encoded_bitmask,
+        )
+        # Update the token in place or use the first free slot on its probe sequence
+        free_slot = None
+        slot = self._home_slot(token.digest)
+        for _ in range(self.capacity):
+            offset = self._offset(slot)
+            state = self._map[offset + 28]
+            if state == _LIVE and self._map[offset : offset + 28] == token.digest:
+                self._map[offset : offset + _RECORD.size] = record
+                return True
+            if state == _TOMBSTONE and free_slot is None:
+                free_slot = slot
+            if state == _EMPTY:
+                if free_slot is None:
+                    free_slot = slot
+                break
+            slot = (slot + 1) & self._mask
+        if free_slot is None:
+            return False
+        offset = self._offset(free_slot)
+        reuses_tombstone = self._map[offset + 28] == _TOMBSTONE
+        _, used_slots = struct.unpack_from("!QQ", self._map, _COUNTERS_OFFSET)
+        if not reuses_tombstone and used_slots + 1 > self.capacity * _MAX_LOAD_FACTOR:
+            return False
+        self._map[offset : offset + _RECORD.size] = record
+        self._adjust_counters(live_records=1, used_slots=0 if reuses_tombstone else 1)
+        return True
+
+    def remove(self, digests: typing.Iterable[bytes]) -> None:
+        """
+        Remove the tokens with the digests from the index
+
+        :param digests: The SHA3-224 digests of the token values
+        :type digests: typing.Iterable[bytes]
+        """
+        with self._writing():
+            for digest in digests:
+                slot = self._find(digest)
+                if slot is not None:
+                    self._map[self._offset(slot) + 28] = _TOMBSTONE
+                    self._adjust_counters(live_records=-1, used_slots=0)
+
+    def remove_owner(self, owner_id: int) -> None:
+        """
+        Remove all tokens of the account from the index
+
+        :param owner_id: The id of the account
+        :type owner_id: int
+        """
+        with self._writing():
+            for slot in range(self.capacity):
+                offset = self._offset(slot)
+                _, state, _, _, _, _, token_owner_id, _ = _RECORD.unpack_from(self._map, offset)
+                if state == _LIVE and token_owner_id == owner_id:
+                    self._map[offset + 28] = _TOMBSTONE
+                    self._adjust_counters(live_records=-1, used_slots=0)
+
+    def compact(self, max_tombstone_share: float = 0.25) -> bool:
+        """
+        Rebuild the hash table without the removed tokens if they use too many slots.
+
+        Lookups during the rebuild miss the index and fall back to the database
+
+        :param max_tombstone_share: The share of the slots removed tokens may use
+        :type max_tombstone_share: float
+        :return: ``True`` if the index was rebuilt
+        :rtype: bool
+        """
+        live_records, used_slots = struct.unpack_from("!QQ", self._map, _COUNTERS_OFFSET)
+        if used_slots - live_records <= self.capacity * max_tombstone_share:
+            return False
+        with self._writing():
+            records = []
+            for slot in range(self.capacity):
+                offset = self._offset(slot)
+                if self._map[offset + 28] == _LIVE:
+                    records.append(self._map[offset : offset + _RECORD.size])
+            self._map[_HEADER_SIZE:] = bytes(self.capacity * _RECORD.size)
+            struct.pack_into("!QQ", self._map, _COUNTERS_OFFSET, 0, 0)
+            for record in records:
+                digest = record[:28]
+                slot = self._home_slot(digest)
+                while self._map[self._offset(slot) + 28] != _EMPTY:
+                    slot = (slot + 1) & self._mask
+                offset = self._offset(slot)
+                self._map[offset : offset + _RECORD.size] = record
+            struct.pack_into("!QQ", self._map, _COUNTERS_OFFSET, len(records), len(records))
+        return True
@@ -1,17 +1,30 @@
 """A collection of tools which are used multiple times in this service"""
 import asyncio
+import dataclasses
 import datetime
+import hashlib
 import logging
+import typing
+
 import tzlocal
 
 import database
 import database.crud
 import enums
+import models.common
 import models.requests
 import models.responses
+import settings
+import signing
 
 _logger = logging.getLogger(__name__)
 
+signed_token_settings: typing.Optional[settings.SignedTokenConfiguration] = None
+"""The settings for the verification of signed access tokens (set by the service if enabled)"""
+
+account_snapshots_enabled: bool = False
+"""Load the token owners from the account snapshots (set by the service if enabled)"""
+
 
 async def is_host_available(host: str, port: int, timeout: float = 10.0) -> bool:
     """
@@ -39,27 +52,84 @@ async def is_host_available(host: str, port: int, timeout: float = 10.0) -> bool
         return False
 
 
+async def are_hosts_available(*hosts: tuple[str, int], timeout: float = 10.0) -> tuple[bool, ...]:
+    """
+    Check if the specified hosts are reachable. The checks are executed concurrently
+
+    :param hosts: The hostnames (or ip-addresses) and ports of the services that shall be checked
+    :type hosts: tuple[str, int]
+    :param timeout: The time that is waited until a single check times out
+    :type timeout: float
+    :return: ``True`` for every host that is reachable on the specified port
+    :rtype: tuple[bool, ...]
+    """
+    return tuple(
+        await asyncio.gather(*[is_host_available(host, port, timeout) for host, port in hosts])
+    )
+
+
 def format_timestamp(t: float):
     return datetime.datetime.fromtimestamp(t).strftime("%A %d.%m.%Y %H:%M:%s")
 
 
+@dataclasses.dataclass
+class _IntrospectionSubject:
+    """The token and account an introspection was about, as far as they have been resolved"""
+
+    token_id: typing.Optional[int] = None
+    account_id: typing.Optional[int] = None
+
+
 def run_token_introspection(
     request: models.requests.TokenValidationData,
 ) -> models.responses.TokenIntrospection:
     """
     Run a new token introspection for the supplied request
 
+    The ids of the introspected token and its owner are attached to the result as private
+    attributes which are not part of the reply
+
     :param request: The request data
     :type request: models.incoming.ValidateTokenRequest
     :return:
     :rtype:
     """
-    # Get information about the two possible token types
-    access_token_information = database.crud.get_access_token_data(request.token)
+    subject = _IntrospectionSubject()
+    introspection = _run_token_introspection(request, subject)
+    introspection._token_id = subject.token_id
+    introspection._account_id = subject.account_id
+    return introspection
+
+
+def _run_token_introspection(
+    request: models.requests.TokenValidationData, subject: _IntrospectionSubject
+) -> models.responses.TokenIntrospection:
+    signed_token = None
+    if signed_token_settings is not None and signing.is_signed_token(request.token):
+        # Signed tokens carry their claims and only need to be checked for a revocation
+        signed_token = signing.verify(
+            request.token, signed_token_settings.secret_key.get_secret_value().encode("utf-8")
+        )
+        if signed_token is None or database.crud.is_access_token_revoked(signed_token.token_id):
+            return models.responses.TokenIntrospection(
+                active=False, reason=enums.TokenIntrospectionFailure.INVALID_TOKEN
+            )
+        access_token_information = models.common.TokenInformation(
+            id=signed_token.token_id,
+            value=hashlib.sha3_224(request.token.encode("utf-8")).hexdigest(),
+            active=True,
+            expires=signed_token.expires,
+            created=signed_token.created,
+            owner_id=signed_token.owner_id,
+        )
+    else:
+        access_token_information = database.crud.get_access_token_data(request.token)
     if access_token_information is None:
         return models.responses.TokenIntrospection(
             active=False, reason=enums.TokenIntrospectionFailure.INVALID_TOKEN
         )
+    subject.token_id = access_token_information.id
+    subject.account_id = access_token_information.owner_id
     if datetime.datetime.now(tz=tzlocal.get_localzone()) > access_token_information.expires:
         return models.responses.TokenIntrospection(
             active=False, reason=enums.TokenIntrospectionFailure.EXPIRED
@@ -69,7 +139,12 @@ def run_token_introspection(
             active=False, reason=enums.TokenIntrospectionFailure.TOKEN_USED_TOO_EARLY
         )
     # Get the information about the user account
-    user = database.crud.get_user_account(access_token_information.owner_id)
+    account_snapshot = None
+    if account_snapshots_enabled:
+        account_snapshot = database.crud.get_account_snapshot(access_token_information.owner_id)
+        user = account_snapshot
+    else:
+        user = database.crud.get_user_account(access_token_information.owner_id)
     if user is None:
         return models.responses.TokenIntrospection(
             active=False, reason=enums.TokenIntrospectionFailure.NO_USER_ASSOCIATED
@@ -78,11 +153,21 @@ def run_token_introspection(
         return models.responses.TokenIntrospection(
             active=False, reason=enums.TokenIntrospectionFailure.USER_DISABLED
         )
-    # Get the scopes of the access token
-    access_token_scopes = database.crud.get_access_token_scopes(access_token_information)
+    if account_snapshot is not None:
+        user = models.responses.UserAccount(
+            id=account_snapshot.account_id,
+            first_name=account_snapshot.first_name,
+            last_name=account_snapshot.last_name,
+            username=account_snapshot.username,
+        )
     if request.scopes is not None:
-        required_scopes = set(sorted(request.scopes))
-        available_scopes = set(sorted([scope.scope_string_value for scope in access_token_scopes]))
+        # Get the scopes of the access token
+        if signed_token is not None:
+            available_scopes = set(signed_token.scopes)
+        else:
+            access_token_scopes = database.crud.get_access_token_scopes(access_token_information)
+            available_scopes = set([scope.scope_string_value for scope in access_token_scopes])
+        required_scopes = set(request.scopes)
         if "administration" in available_scopes:
             return models.responses.TokenIntrospection(
                 active=True,
@@ -0,0 +1,75 @@
+"""
+Compact MessagePack encoding of the requests and replies as an alternative to JSON
+
+Callers opt in by sending a MessagePack encoded message, which is answered with a MessagePack
+encoded reply. Since the executor only receives the message body, the encoding is detected by the
+first byte of the message: JSON messages start with an ASCII character while MessagePack maps and
+arrays start with a byte above ``0x7f``.
+
+A token introspection request may be sent as a map using the same keys as the JSON request or as
+an array with the fixed layout ``[action, token, scopes, deadline]`` (the trailing elements are
+optional). Token introspection replies are arrays with the fixed layout
+``[active, reason, scope, token_type, exp, iat, user]`` where ``user`` is either ``None`` or the
+array ``[id, username, first_name, last_name]``. All other replies are maps using the keys of the
+JSON replies
+"""
+import typing
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+import models.responses
+
+_TOKEN_VALIDATION_FIELDS = ("action", "token", "scopes", "deadline")
+"""The layout of token introspection requests sent as array"""
+
+
+def is_msgpack(message: bytes) -> bool:
+    """Check if the message is MessagePack encoded"""
+    return msgpack is not None and len(message) > 0 and message[0] >= 0x80
+
+
+def decode_request(message: bytes) -> typing.Any:
+    """
+    Decode a MessagePack encoded request into the structure of the equivalent JSON request
+
+    :param message: The MessagePack encoded request
+    :type message: bytes
+    :return: The content of the request
+    :rtype: typing.Any
+    """
+    content = msgpack.unpackb(message, raw=False)
+    if type(content) is list:
+        return dict(zip(_TOKEN_VALIDATION_FIELDS, content))
+    return content
+
+
+def encode(content: typing.Any) -> bytes:
+    """Encode the reply content"""
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def encode_introspection(introspection: models.responses.TokenIntrospection) -> bytes:
+    """
+    Encode a token introspection reply using the fixed array layout
+
+    :param introspection: The result of the token introspection
+    :type introspection: models.responses.TokenIntrospection
+    :return: The encoded reply
+    :rtype: bytes
+    """
+    user = introspection.user
+    return msgpack.packb(
+        [
+            introspection.active,
+            None if introspection.reason is None else introspection.reason.value,
+            introspection.scope,
+            introspection.token_type,
+            introspection.expires_at,
+            introspection.created_at,
+            None if user is None else [user.id, user.username, user.first_name, user.last_name],
+        ],
+        use_bin_type=True,
+    )